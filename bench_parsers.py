@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Parser benchmark for ship tracking bot
+Times the scoped fast path against the full BeautifulSoup parse over the
+page fixtures in fixtures/ and reports parse time and peak allocations for each
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+import page_parsers
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+PARSERS = {
+    'cruisemapper': page_parsers.parse_cruisemapper_fields,
+    'vesselfinder': page_parsers.parse_vesselfinder_fields,
+}
+
+def load_corpus():
+    """Load (source, name, html) for every page fixture"""
+    corpus = []
+    for source in PARSERS:
+        for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, source, '*.html'))):
+            with open(path, encoding='utf-8') as f:
+                corpus.append((source, os.path.basename(path), f.read()))
+    return corpus
+
+def time_parse(parse, html, fast, iterations):
+    """Return per-call parse times in milliseconds"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        parse(html, fast=fast)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def measure_peak_allocation(parse, html, fast):
+    """Return the peak KiB allocated during a single parse"""
+    tracemalloc.start()
+    try:
+        parse(html, fast=fast)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+def run(iterations):
+    corpus = load_corpus()
+    if not corpus:
+        print(f"No fixtures found in {FIXTURE_DIR}")
+        return 1
+
+    print(f"{'fixture':<60} {'path':<5} {'median ms':>10} {'p95 ms':>8} {'peak KiB':>9}  match")
+    exit_code = 0
+    for source, name, html in corpus:
+        parse = PARSERS[source]
+        fast_fields = parse(html, fast=True)
+        slow_fields = parse(html, fast=False)
+        match = fast_fields == slow_fields
+        if not match:
+            exit_code = 1
+
+        label = f"{source}/{name} ({len(html) // 1024} KiB)"
+        for path_name, fast in (('fast', True), ('soup', False)):
+            # Warm up regex caches and imports before timing
+            parse(html, fast=fast)
+            timings = sorted(time_parse(parse, html, fast, iterations))
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            peak_kib = measure_peak_allocation(parse, html, fast)
+            print(f"{label:<60} {path_name:<5} {statistics.median(timings):>10.3f} {p95:>8.3f} "
+                  f"{peak_kib:>9.0f}  {'yes' if match else 'NO'}")
+            label = ''
+
+    return exit_code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CruiseMapper/VesselFinder page parsers")
+    parser.add_argument('--iterations', type=int, default=50, help="timed parses per fixture and path")
+    args = parser.parse_args()
+    raise SystemExit(run(args.iterations))
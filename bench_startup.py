@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for ship tracking bot
+Times importing main and running the bot's setup_hook in fresh interpreters, checks
+that the heavy optional libraries stayed unloaded, and fails when over budget
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Loaded on first use only; any of these at startup is a regression
+LAZY_MODULES = ('selenium', 'bs4', 'PIL', 'aiohttp.web')
+
+async def measure_child():
+    """Runs in the child interpreter: import, then get the bot ready short of logging in"""
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    bot = main.bot
+    await bot.setup_hook()
+    ready = time.perf_counter()
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    bot.periodic_update.cancel()
+    await bot.fleet_tracker.close()
+    return {
+        'import_ms': (imported - start) * 1000,
+        'ready_ms': (ready - start) * 1000,
+        'lazy_loaded': loaded
+    }
+
+def run_child(work_dir):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT + os.pathsep + env.get('PYTHONPATH', ''),
+        'VESSELS_FILE': os.path.join(ROOT, 'vessels.json'),
+        'POSITION_HISTORY_DIR': os.path.join(work_dir, 'history'),
+        'METRICS_PORT': '0',
+        'SNAPSHOT_POLL_SECONDS': '0',
+        'SYNC_SLASH_COMMANDS': 'false',
+    })
+    # Run from a scratch directory so the bot's log file lands there
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'bench_startup.py'), '--child'],
+                            cwd=work_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run(runs, import_budget_ms, ready_budget_ms):
+    with tempfile.TemporaryDirectory(prefix='whereiscowie-startup-') as work_dir:
+        samples = [run_child(work_dir) for _ in range(runs)]
+
+    exit_code = 0
+    print(f"{'stage':<8} {'median ms':>10} {'max ms':>8} {'budget ms':>10}")
+    for stage, budget in (('import', import_budget_ms), ('ready', ready_budget_ms)):
+        timings = [sample[f'{stage}_ms'] for sample in samples]
+        median = statistics.median(timings)
+        over = budget and median > budget
+        print(f"{stage:<8} {median:>10.1f} {max(timings):>8.1f} {budget or '-':>10}{'  OVER BUDGET' if over else ''}")
+        if over:
+            exit_code = 1
+
+    loaded = sorted({name for sample in samples for name in sample['lazy_loaded']})
+    if loaded:
+        print(f"Loaded at startup but should be lazy: {', '.join(loaded)}")
+        exit_code = 1
+    return exit_code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bot import and time-to-ready")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument('--import-budget-ms', type=float, default=1000, help="median import budget (0 = none)")
+    parser.add_argument('--ready-budget-ms', type=float, default=1500, help="median time-to-ready budget (0 = none)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(measure_child())))
+        raise SystemExit(0)
+    raise SystemExit(run(args.runs, args.import_budget_ms, args.ready_budget_ms))
@@ -0,0 +1,74 @@
+"""
+Channel broadcasting for ship tracking bot
+Sends one rendered update to every subscribed channel with bounded, paced parallelism
+"""
+
+import asyncio
+import io
+import logging
+import time
+import discord
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class ChannelBroadcaster:
+    def __init__(self, concurrency=25, rate=40):
+        self.channels = {}
+        self.concurrency = concurrency
+        # Each channel is its own Discord route and discord.py retries per-route 429s,
+        # so the binding limit is the bot-wide one; pace sends to stay under it
+        self.pacer = TokenBucket(rate, burst=max(1, int(rate))) if rate > 0 else None
+
+    def subscribe(self, channel):
+        """Add a channel; returns False if it was already subscribed"""
+        if channel.id in self.channels:
+            return False
+        self.channels[channel.id] = channel
+        return True
+
+    def unsubscribe(self, channel):
+        """Remove a channel; returns False if it was not subscribed"""
+        return self.channels.pop(channel.id, None) is not None
+
+    def __contains__(self, channel):
+        return channel.id in self.channels
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __bool__(self):
+        return bool(self.channels)
+
+    async def broadcast(self, content, embed, image=None, filename=None):
+        """
+        Send the same message to every subscribed channel concurrently
+        Channels that no longer exist or that the bot can't post in are unsubscribed
+        Returns counts of sent, failed and removed channels
+        """
+        channels = list(self.channels.values())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.monotonic()
+
+        async def send(channel):
+            async with semaphore:
+                if self.pacer:
+                    await self.pacer.acquire()
+                try:
+                    # A discord.File is consumed by one send, so wrap the shared bytes per message
+                    file = discord.File(io.BytesIO(image), filename=filename) if image else None
+                    await channel.send(content, embed=embed, file=file)
+                    return 'sent'
+                except (discord.Forbidden, discord.NotFound) as e:
+                    logger.warning(f"Unsubscribing channel {channel.id}: {e}")
+                    self.channels.pop(channel.id, None)
+                    return 'removed'
+                except Exception as e:
+                    logger.error(f"Error broadcasting to channel {channel.id}: {e}")
+                    return 'failed'
+
+        outcomes = await asyncio.gather(*(send(channel) for channel in channels))
+        counts = {outcome: outcomes.count(outcome) for outcome in ('sent', 'failed', 'removed')}
+        logger.info(f"Broadcast to {len(channels)} channels in {time.monotonic() - start:.1f}s "
+                    f"({counts['sent']} sent, {counts['failed']} failed, {counts['removed']} removed)")
+        return counts
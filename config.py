@@ -16,22 +16,107 @@ class Config:
     SPIRIT_OF_ADVENTURE_IMO = "9818084"
     SPIRIT_OF_ADVENTURE_MMSI = "232026551"
     
+    # Fleet tracking: JSON list of {"name", "imo", "mmsi", "aliases"}; the first entry is the default ship
+    VESSELS_FILE = os.getenv('VESSELS_FILE', 'vessels.json')
+    FLEET_CONCURRENCY = int(os.getenv('FLEET_CONCURRENCY', '8'))  # Vessels refreshed at once
+    
+    # Outbound requests per second and burst size for each tracking site's host
+    HOST_RATE_LIMITS = {
+        'www.cruisemapper.com': (float(os.getenv('CRUISEMAPPER_RATE_LIMIT', '2')), 4),
+        'www.vesselfinder.com': (float(os.getenv('VESSELFINDER_RATE_LIMIT', '1')), 2),
+        'services.marinetraffic.com': (float(os.getenv('MARINETRAFFIC_RATE_LIMIT', '1')), 2),
+    }
+    
+    # HTTP connection pool shared by every outbound request
+    HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))  # Open connections in total
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '8'))  # Open connections to one host
+    HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))  # Seconds a DNS lookup is reused
+    HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '30'))  # Idle seconds before a connection is closed
+    
     # Bot configuration
     COMMAND_PREFIX = ['!', '/']
     AUTO_UPDATE_TIMES = ['06:00', '12:00', '16:00']  # UTC times for scheduled updates
     RATE_LIMIT_SECONDS = 30
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '25'))  # Scheduled update sends in flight at once
+    BROADCAST_RATE_LIMIT = float(os.getenv('BROADCAST_RATE_LIMIT', '40'))  # Sends per second, under Discord's 50/s global limit
+    SNAPSHOT_CACHE_TTL = float(os.getenv('SNAPSHOT_CACHE_TTL', '60'))  # Seconds a fetched snapshot is reused
+    SNAPSHOT_MAX_STALE = float(os.getenv('SNAPSHOT_MAX_STALE', '3600'))  # Older snapshots are answered at once while refreshing
+    SNAPSHOT_POLL_SECONDS = float(os.getenv('SNAPSHOT_POLL_SECONDS', '45'))  # Background refresh interval for the default ship (0 = off)
+    
+    # Position history: every fetched position is appended to <dir>/<imo>.pos (18 bytes per row)
+    POSITION_HISTORY_DIR = os.getenv('POSITION_HISTORY_DIR', 'history')
+    
+    # Last good snapshot (and map) per vessel, saved on each refresh and loaded at startup
+    SNAPSHOT_STORE_DIR = os.getenv('SNAPSHOT_STORE_DIR', 'state')
+    
+    # Worker process: fetch, parse and render outside the bot process, talking over a Unix socket
+    WORKER_SOCKET = os.getenv('WORKER_SOCKET', 'whereiscowie-worker.sock')
+    WORKER_TIMEOUT_SECONDS = float(os.getenv('WORKER_TIMEOUT_SECONDS', '60'))  # Per request
+    
+    # Dead reckoning: project cached fixes along speed and course instead of refetching
+    DEAD_RECKONING_MIN_SECONDS = float(os.getenv('DEAD_RECKONING_MIN_SECONDS', '60'))  # Younger fixes are shown as is
+    DEAD_RECKONING_MAX_SECONDS = float(os.getenv('DEAD_RECKONING_MAX_SECONDS', str(3 * 3600)))  # Older fixes aren't projected
     
-    # API endpoints
-    VESSELFINDER_BASE_URL = "https://www.vesselfinder.com/api"
-    MARINETRAFFIC_BASE_URL = "https://services.marinetraffic.com/api"
+    # Source health: after this many consecutive failures a source is skipped for SOURCE_OPEN_SECONDS,
+    # then probed once; each failed probe doubles the wait up to SOURCE_MAX_OPEN_SECONDS
+    SOURCE_FAILURE_THRESHOLD = int(os.getenv('SOURCE_FAILURE_THRESHOLD', '3'))
+    SOURCE_OPEN_SECONDS = float(os.getenv('SOURCE_OPEN_SECONDS', '30'))
+    SOURCE_MAX_OPEN_SECONDS = float(os.getenv('SOURCE_MAX_OPEN_SECONDS', '600'))
+    
+    # CruiseMapper streaming: stop downloading once the ship data has been read
+    CRUISEMAPPER_STREAMING = os.getenv('CRUISEMAPPER_STREAMING', 'true').lower() == 'true'
+    CRUISEMAPPER_MAX_BYTES = int(os.getenv('CRUISEMAPPER_MAX_BYTES', str(1024 * 1024)))  # Hard cap on bytes read per page
+    CRUISEMAPPER_CHUNK_BYTES = 16 * 1024
+    
+    # Map screenshot browser pool
+    SCREENSHOT_POOL_SIZE = int(os.getenv('SCREENSHOT_POOL_SIZE', '2'))  # Max concurrent Chrome instances
+    SCREENSHOT_DRIVER_MAX_USES = int(os.getenv('SCREENSHOT_DRIVER_MAX_USES', '50'))  # Recycle a driver after this many screenshots
+    SCREENSHOT_TIMEOUT_SECONDS = float(os.getenv('SCREENSHOT_TIMEOUT_SECONDS', '30'))  # Give up on a screenshot after this long
+    
+    # Progressive replies: send the ship data at once and edit the map in when it is rendered
+    PROGRESSIVE_RESPONSES = os.getenv('PROGRESSIVE_RESPONSES', 'true').lower() == 'true'
+    MAP_DEADLINE_SECONDS = float(os.getenv('MAP_DEADLINE_SECONDS', '45'))  # Then give a map link instead
+    SYNC_SLASH_COMMANDS = os.getenv('SYNC_SLASH_COMMANDS', 'true').lower() == 'true'  # Register /cowie at startup
+    
+    # Map rendering: 'browser' screenshots OpenStreetMap in Chrome, 'tiles' stitches map tiles directly
+    MAP_RENDERER = os.getenv('MAP_RENDERER', 'browser').lower()
+    MAP_ZOOM = int(os.getenv('MAP_ZOOM', '8'))
+    MAP_TILE_URL = os.getenv('MAP_TILE_URL', 'https://tile.openstreetmap.org/{z}/{x}/{y}.png')  # URL or local path template
+    MAP_TILE_CACHE_DIR = os.getenv('MAP_TILE_CACHE_DIR', 'tile_cache')
+    MAP_TILE_CACHE_MAX_MB = int(os.getenv('MAP_TILE_CACHE_MAX_MB', '200'))
+    MAP_IMAGE_CACHE_MAX_MB = int(os.getenv('MAP_IMAGE_CACHE_MAX_MB', '32'))  # In-memory cache of rendered maps
+    
+    # Metrics: Prometheus text format at http://<host>:<port>/metrics (port 0 = off)
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Off unless set, e.g. 9108
+    
+    # Site roots the ship data is fetched from; point them at replay_server.py to run offline
+    CRUISEMAPPER_BASE_URL = os.getenv('CRUISEMAPPER_BASE_URL', 'https://www.cruisemapper.com').rstrip('/')
+    VESSELFINDER_BASE_URL = os.getenv('VESSELFINDER_BASE_URL', 'https://www.vesselfinder.com').rstrip('/')
+    MARINETRAFFIC_BASE_URL = os.getenv('MARINETRAFFIC_BASE_URL', 'https://services.marinetraffic.com').rstrip('/')
     
     # Logging configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.getenv('LOG_FILE', 'whereiscowie.log')
+    LOG_FILE = os.getenv('LOG_FILE', 'whereiscowie.log')  # Empty to log to the console only
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # 'text' or 'json' (one JSON object per line)
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # Rotate the log file at this size
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')  # Rotate by time instead, e.g. 'midnight' or 'H'
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))  # Rotated files kept
     
     # Feature flags
     ENABLE_AUTO_UPDATES = os.getenv('ENABLE_AUTO_UPDATES', 'true').lower() == 'true'
-    ENABLE_RATE_LIMITING = os.getenv('ENABLE_RATE_LIMITING', 'true').lower() == 'true'
+    ENABLE_RATE_LIMITING = os.getenv('ENABLE_RATE_LIMITING', 'true').lower() == 'true'  # Per-host limits on outbound requests
+    ENABLE_HEDGED_FETCH = os.getenv('ENABLE_HEDGED_FETCH', 'true').lower() == 'true'
+    ENABLE_ADAPTIVE_SOURCES = os.getenv('ENABLE_ADAPTIVE_SOURCES', 'true').lower() == 'true'  # Health-ordered sources with circuit breakers
+    ENABLE_DEAD_RECKONING = os.getenv('ENABLE_DEAD_RECKONING', 'true').lower() == 'true'
+    ENABLE_POSITION_HISTORY = os.getenv('ENABLE_POSITION_HISTORY', 'true').lower() == 'true'
+    ENABLE_WORKER = os.getenv('ENABLE_WORKER', 'false').lower() == 'true'
+    ENABLE_SNAPSHOT_STORE = os.getenv('ENABLE_SNAPSHOT_STORE', 'true').lower() == 'true'
+    SNAPSHOT_STORE_MAPS = os.getenv('SNAPSHOT_STORE_MAPS', 'true').lower() == 'true'  # Also keep the last rendered map
+    ENABLE_FAST_PARSERS = os.getenv('ENABLE_FAST_PARSERS', 'true').lower() == 'true'  # Falls back to BeautifulSoup when incomplete
+    
+    # Hedged fetching: seconds to wait on a source before also starting the next (0 = race all at once)
+    HEDGE_DELAY_SECONDS = float(os.getenv('HEDGE_DELAY_SECONDS', '3'))
     
     @classmethod
     def validate_config(cls):
@@ -0,0 +1,84 @@
+"""
+Dead reckoning for ship tracking bot
+Projects a ship's last fix forward along its great-circle track using speed and course
+"""
+
+import math
+import time
+
+EARTH_RADIUS_NM = 3440.065
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    """Initial great-circle bearing in degrees from one point to another"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    y = math.sin(dlon) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlon)
+    return math.degrees(math.atan2(y, x)) % 360
+
+def distance_nm(lat1, lon1, lat2, lon2):
+    """Great-circle distance in nautical miles"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_NM * math.asin(min(1.0, math.sqrt(a)))
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def estimate_positions(snapshots, now=None, min_age=60, max_age=3 * 3600, min_speed=0.5):
+    """
+    Estimate where each ship is now from its last fix
+    Each snapshot needs latitude, longitude, speed (knots), course (degrees) and
+    fetched_at (epoch seconds). Snapshots that can't be projected, or whose fix is
+    younger than min_age or older than max_age, are returned unchanged; the rest are
+    returned as copies with the estimated latitude/longitude, 'estimated' set,
+    'fix_age_seconds', and the original fix in fix_latitude/fix_longitude.
+    """
+    now = time.time() if now is None else now
+    sin, cos, asin, atan2 = math.sin, math.cos, math.asin, math.atan2
+    radians, degrees = math.radians, math.degrees
+
+    results = []
+    for snapshot in snapshots:
+        if not snapshot or snapshot.get('error') or snapshot.get('estimated'):
+            results.append(snapshot)
+            continue
+        lat = _number(snapshot.get('latitude'))
+        lon = _number(snapshot.get('longitude'))
+        speed = _number(snapshot.get('speed'))
+        course = _number(snapshot.get('course'))
+        fetched_at = _number(snapshot.get('fetched_at'))
+        if None in (lat, lon, speed, course, fetched_at) or speed < min_speed:
+            results.append(snapshot)
+            continue
+        age = now - fetched_at
+        if not min_age <= age <= max_age:
+            results.append(snapshot)
+            continue
+
+        # Destination point given start, bearing and angular distance
+        delta = speed * age / 3600 / EARTH_RADIUS_NM
+        theta = radians(course)
+        phi1, lambda1 = radians(lat), radians(lon)
+        sin_phi2 = sin(phi1) * cos(delta) + cos(phi1) * sin(delta) * cos(theta)
+        phi2 = asin(max(-1.0, min(1.0, sin_phi2)))
+        lambda2 = lambda1 + atan2(sin(theta) * sin(delta) * cos(phi1), cos(delta) - sin(phi1) * sin_phi2)
+
+        estimate = dict(snapshot)
+        estimate['fix_latitude'] = lat
+        estimate['fix_longitude'] = lon
+        estimate['latitude'] = degrees(phi2)
+        estimate['longitude'] = (degrees(lambda2) + 540) % 360 - 180
+        estimate['fix_age_seconds'] = age
+        estimate['estimated'] = True
+        results.append(estimate)
+    return results
+
+def estimate_position(snapshot, now=None, **limits):
+    """Estimate one ship's position; see estimate_positions"""
+    return estimate_positions([snapshot], now, **limits)[0]
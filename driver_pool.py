@@ -0,0 +1,129 @@
+"""
+Headless browser pool for map screenshots
+Keeps a bounded set of long-lived Chrome drivers warm and reuses them across requests
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+class DriverPool:
+    def __init__(self, factory, run_blocking, max_size=2, max_uses=50):
+        self.factory = factory
+        self.run_blocking = run_blocking
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(max_size)
+        self.in_use = 0
+        self.created = 0
+        self.recycled = 0
+        self.closed = False
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Lease a healthy driver. Callers queue once max_size drivers are leased.
+        A driver whose block raises is treated as crashed and replaced.
+        """
+        if self.closed:
+            raise RuntimeError("Driver pool is closed")
+
+        await self._semaphore.acquire()
+        pooled = None
+        broken = False
+        try:
+            pooled = await self._checkout()
+            self.in_use += 1
+            yield pooled.driver
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            if pooled is not None:
+                self.in_use -= 1
+                await self._checkin(pooled, broken)
+            self._semaphore.release()
+
+    async def _checkout(self):
+        """Take a healthy idle driver or start a new one"""
+        while self._idle:
+            pooled = self._idle.pop()
+            try:
+                healthy = await self.run_blocking(self._is_healthy, pooled.driver)
+            except asyncio.CancelledError:
+                self._idle.append(pooled)
+                raise
+            if healthy:
+                return pooled
+            logger.warning("Discarding unresponsive Chrome driver")
+            await self._retire(pooled)
+
+        future = asyncio.ensure_future(self.run_blocking(self.factory))
+        try:
+            driver = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Chrome keeps starting in its worker thread; quit it once it is up
+            future.add_done_callback(self._quit_abandoned)
+            raise
+        if driver is None:
+            raise RuntimeError("Chrome driver unavailable")
+        self.created += 1
+        return PooledDriver(driver)
+
+    async def _checkin(self, pooled, broken):
+        """Return a driver to the pool, or retire it if crashed or worn out"""
+        pooled.uses += 1
+        if broken or self.closed or pooled.uses >= self.max_uses:
+            await self._retire(pooled)
+        else:
+            self._idle.append(pooled)
+
+    async def _retire(self, pooled):
+        """Quit a driver off the event loop"""
+        self.recycled += 1
+        # Shielded so a cancelled caller still gets its Chrome shut down
+        await asyncio.shield(self.run_blocking(self._quit, pooled.driver))
+
+    def _quit_abandoned(self, future):
+        """Quit a driver whose requester was cancelled while it started"""
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            asyncio.ensure_future(self.run_blocking(self._quit, future.result()))
+
+    def _is_healthy(self, driver):
+        """Check the browser session still answers"""
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        """Shut down a single driver"""
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Error closing driver: {e}")
+
+    async def close(self):
+        """Shut down all idle drivers; leased ones are closed when returned"""
+        self.closed = True
+        while self._idle:
+            await self._retire(self._idle.pop())
+
+    def stats(self):
+        """Get pool occupancy counters"""
+        return {
+            'size': self.max_size,
+            'in_use': self.in_use,
+            'idle': len(self._idle),
+            'created': self.created,
+            'recycled': self.recycled
+        }
@@ -0,0 +1,154 @@
+"""
+Fleet tracking for ship tracking bot
+Refreshes many vessels concurrently over one shared HTTP client
+"""
+
+import asyncio
+import logging
+import time
+from config import Config
+from http_client import HttpClient
+from map_screenshot import MapScreenshotter
+from metrics import REGISTRY, register_cache
+from position_history import PositionHistory
+from ship_tracker import ShipTracker, create_source_health, estimate_current_positions
+from snapshot_cache import SnapshotCache
+from snapshot_store import SnapshotStore
+from vessels import VesselRegistry
+from voyage import VoyageEstimator
+from worker import WorkerClient
+
+logger = logging.getLogger(__name__)
+
+class FleetTracker:
+    def __init__(self, registry=None):
+        self.registry = registry or VesselRegistry.load(Config.VESSELS_FILE)
+        self.http_client = HttpClient()
+        # Optionally fetch and render in a separate process, away from the Discord gateway
+        self.worker = WorkerClient(Config.WORKER_SOCKET, timeout=Config.WORKER_TIMEOUT_SECONDS) if Config.ENABLE_WORKER else None
+        self.map_screenshotter = MapScreenshotter(self.http_client, self.worker)
+        self.snapshot_cache = SnapshotCache(Config.SNAPSHOT_CACHE_TTL, Config.SNAPSHOT_MAX_STALE)
+        self.position_history = PositionHistory(Config.POSITION_HISTORY_DIR)
+        self.voyage_estimator = VoyageEstimator(self.position_history)
+        self.source_health = create_source_health()
+        self.snapshot_store = SnapshotStore(Config.SNAPSHOT_STORE_DIR, Config.SNAPSHOT_STORE_MAPS)
+        self.trackers = {}
+        self._restore_task = None
+        self.default_tracker = self.get_tracker(self.registry.default)
+
+    async def start(self):
+        """Open the HTTP connection pool shared by every tracker, and start the worker"""
+        await self.http_client.start()
+        if self.worker is not None:
+            await self.worker.start()
+
+    def restore_snapshots(self):
+        """
+        Seed every vessel's caches from its saved snapshot, then refresh them in the
+        background with at most FLEET_CONCURRENCY in flight; returns how many were restored
+        """
+        restored = [tracker for tracker in map(self.get_tracker, self.registry) if tracker.restore_snapshot(prefetch=False)]
+        if restored:
+            self._restore_task = asyncio.create_task(self._refresh_restored(restored))
+        return len(restored)
+
+    async def _refresh_restored(self, trackers):
+        semaphore = asyncio.Semaphore(Config.FLEET_CONCURRENCY)
+
+        async def refresh(tracker):
+            async with semaphore:
+                # A request for this vessel may already have refreshed it
+                if not self.snapshot_cache.restored(tracker.ship_imo):
+                    return
+                try:
+                    await tracker.refresh_snapshot()
+                except Exception as e:
+                    logger.error(f"Error refreshing restored snapshot for {tracker.ship_name}: {e}")
+
+        await asyncio.gather(*(refresh(tracker) for tracker in trackers))
+
+    def register_metrics(self):
+        """Expose the shared caches and the screenshot browser pool as metrics gauges"""
+        register_cache('snapshots', self.snapshot_cache.stats)
+        register_cache('map_images', self.map_screenshotter.image_cache.stats)
+        if self.map_screenshotter.tile_renderer.tile_cache is not None:
+            register_cache('map_tiles', self.map_screenshotter.tile_renderer.tile_cache.stats)
+        register_cache('routes', self.voyage_estimator.stats)
+        driver_pool = self.map_screenshotter.driver_pool
+        REGISTRY.gauge(
+            'whereiscowie_screenshot_drivers',
+            "Headless browsers in the screenshot pool by state ('size' is the pool limit)",
+            ('state',),
+            lambda: {(state,): driver_pool.stats()[state] for state in ('in_use', 'idle', 'size')}
+        )
+        source_health = self.source_health
+        REGISTRY.gauge(
+            'whereiscowie_source_circuit_open',
+            "1 while a data source's circuit breaker keeps requests away from it",
+            ('source',),
+            lambda: {(name,): int(stats['state'] == 'open') for name, stats in source_health.stats().items()}
+        )
+        REGISTRY.gauge(
+            'whereiscowie_source_success_rate',
+            "Rolling success rate of each data source",
+            ('source',),
+            lambda: {(name,): stats['success_rate'] for name, stats in source_health.stats().items()}
+        )
+        REGISTRY.gauge(
+            'whereiscowie_source_expected_seconds',
+            "Expected time to valid data from each data source, used to order them",
+            ('source',),
+            lambda: {(name,): stats['expected_seconds'] for name, stats in source_health.stats().items()}
+        )
+
+    def get_tracker(self, vessel):
+        """Get the tracker for a vessel, creating it on first use"""
+        tracker = self.trackers.get(vessel.imo)
+        if tracker is None:
+            tracker = self.trackers[vessel.imo] = ShipTracker(vessel, fleet=self)
+        return tracker
+
+    def resolve(self, query):
+        """Get the tracker for a name, alias or IMO, or None if unknown"""
+        vessel = self.registry.resolve(query)
+        return self.get_tracker(vessel) if vessel else None
+
+    async def refresh_all(self, vessels=None):
+        """
+        Fetch every vessel with at most FLEET_CONCURRENCY in flight
+        Returns a dict of IMO to ship data
+        """
+        vessels = list(vessels or self.registry)
+        semaphore = asyncio.Semaphore(Config.FLEET_CONCURRENCY)
+        start = time.monotonic()
+
+        async def refresh(vessel):
+            async with semaphore:
+                try:
+                    return vessel.imo, await self.get_tracker(vessel).fetch_ais_fix()
+                except Exception as e:
+                    logger.error(f"Error refreshing {vessel.name}: {e}")
+                    return vessel.imo, {'error': True, 'message': str(e), 'ship_name': vessel.name, 'imo': vessel.imo}
+
+        fixes = await asyncio.gather(*(refresh(vessel) for vessel in vessels))
+        # Project every ship's last fix forward in one pass
+        estimates = estimate_current_positions([data for _, data in fixes])
+        results = {imo: data for (imo, _), data in zip(fixes, estimates)}
+        failed = sum(1 for data in results.values() if data.get('error'))
+        logger.info(f"Refreshed {len(results)} vessels in {time.monotonic() - start:.1f}s ({failed} failed)")
+        return results
+
+    async def close(self):
+        """Release the shared HTTP client and pooled screenshot browsers"""
+        if self._restore_task is not None:
+            self._restore_task.cancel()
+            try:
+                await self._restore_task
+            except asyncio.CancelledError:
+                pass
+        for tracker in self.trackers.values():
+            await tracker.stop_polling()
+        await self.map_screenshotter.close()
+        await self.http_client.close()
+        if self.worker is not None:
+            await self.worker.close()
@@ -0,0 +1,147 @@
+"""
+HTTP client for ship tracking bot
+One tuned connection pool with per-host rate limits and conditional GET revalidation
+"""
+
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import aiohttp
+from config import Config
+from metrics import HTTP_RESPONSES
+from rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+def _payload_size(payload):
+    """Rough size of a stored payload; parsed fields are small next to page text"""
+    return len(payload) if isinstance(payload, (str, bytes)) else 256
+
+class RevalidationCache:
+    def __init__(self, max_entries=32, max_bytes=8 * 1024 * 1024):
+        # A couple of pages per tracked vessel; whole pages are kept to answer 304s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.revalidated = 0
+
+    def headers_for(self, url):
+        """Conditional request headers for a previously seen URL"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return {}
+        etag, last_modified, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def payload(self, url):
+        """Payload stored for a URL, used when the server answers 304"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        self._entries.move_to_end(url)
+        self.revalidated += 1
+        return entry[2]
+
+    def store(self, url, response, payload):
+        """Remember a response's validators alongside what was made of its body"""
+        self.forget(url)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if (not etag and not last_modified) or payload is None or _payload_size(payload) > self.max_bytes:
+            return
+        self._entries[url] = (etag, last_modified, payload)
+        self.bytes += _payload_size(payload)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.bytes -= _payload_size(evicted)
+
+    def forget(self, url):
+        """Drop a URL's validators and payload"""
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.bytes -= _payload_size(entry[2])
+
+class HttpClient:
+    def __init__(self):
+        self.session = None
+        # With rate limiting off, every host is unlimited
+        self.rate_limiter = RateLimiter(Config.HOST_RATE_LIMITS if Config.ENABLE_RATE_LIMITING else {})
+        self.revalidation = RevalidationCache()
+
+    async def start(self):
+        """Open the connection pool"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=Config.HTTP_POOL_LIMIT,
+                limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=Config.HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=Config.HTTP_KEEPALIVE_SECONDS
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30),
+                headers={'User-Agent': 'WhereIsCowieBot/1.0'}
+            )
+        return self.session
+
+    async def get_session(self):
+        """Get the session, opening it on first use outside the bot"""
+        if self.session is None or self.session.closed:
+            await self.start()
+        return self.session
+
+    async def close(self):
+        """Close the connection pool"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    @asynccontextmanager
+    async def get(self, url, headers=None, revalidate=False, **kwargs):
+        """
+        GET a URL once its host's rate limit allows. With revalidate, validators
+        from the last stored response are sent so an unchanged page costs a 304.
+        """
+        host = urlsplit(url).hostname
+        await self.rate_limiter.acquire(host)
+        if revalidate:
+            headers = {**(headers or {}), **self.revalidation.headers_for(url)}
+        session = await self.get_session()
+        responded = False
+        try:
+            async with session.get(url, headers=headers, **kwargs) as response:
+                responded = True
+                HTTP_RESPONSES.inc(host, response.status)
+                yield response
+        except Exception:
+            if not responded:
+                HTTP_RESPONSES.inc(host, 'error')
+            raise
+
+    async def fetch_text(self, url, headers=None):
+        """
+        GET a page with revalidation
+        Returns (status, text); a 304 is reported as 200 with the stored text
+        """
+        for revalidate in (True, False):
+            async with self.get(url, headers=headers, revalidate=revalidate) as response:
+                if response.status == 304:
+                    text = self.revalidation.payload(url)
+                    if text is not None:
+                        return 200, text
+                    # The stored page is gone, so ask again for all of it
+                    logger.warning(f"304 for {url} without a stored page, refetching")
+                    self.revalidation.forget(url)
+                    continue
+                if response.status != 200:
+                    return response.status, None
+                text = await response.text()
+                self.revalidation.store(url, response, text)
+                return 200, text
+        return 304, None
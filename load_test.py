@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Load test for ship tracking bot
+Drives ShipTracker.get_ship_status_embed at a target concurrency against the
+replay server and reports throughput and latency percentiles, so regressions in
+the fetch, parse and render path show up without touching the live sites
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+import replay_server
+from config import Config
+from ship_tracker import ShipTracker
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def configure(environment, cache_ttl, work_dir):
+    """Point Config at the replay server before any tracker is built"""
+    for key, value in environment.items():
+        setattr(Config, key, value)
+    Config.SNAPSHOT_CACHE_TTL = cache_ttl
+    Config.SNAPSHOT_MAX_STALE = 0
+    Config.SNAPSHOT_POLL_SECONDS = 0
+    Config.MAP_TILE_CACHE_DIR = work_dir + '/tiles'
+    Config.POSITION_HISTORY_DIR = work_dir + '/history'
+    # Keep replayed snapshots out of the bot's real last-known state
+    Config.SNAPSHOT_STORE_DIR = work_dir + '/state'
+
+async def drive(tracker, concurrency, requests, duration):
+    """Call get_ship_status_embed from concurrency workers; returns (latencies, errors, elapsed)"""
+    latencies = []
+    errors = 0
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    async def worker():
+        nonlocal errors, issued
+        while (deadline is None and issued < requests) or (deadline is not None and time.perf_counter() < deadline):
+            issued += 1
+            began = time.perf_counter()
+            try:
+                result = await tracker.get_ship_status_embed()
+                embed = result[0] if isinstance(result, tuple) else result
+                if embed.title and embed.title.startswith('❌'):
+                    errors += 1
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Request failed: {e}")
+                errors += 1
+            latencies.append(time.perf_counter() - began)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+async def run(args):
+    server = None
+    if args.target:
+        environment = replay_server.replay_environment(args.target)
+    else:
+        server = replay_server.server_from_args(args)
+        await server.start()
+        environment = server.environment()
+
+    with tempfile.TemporaryDirectory(prefix='whereiscowie-load-') as work_dir:
+        configure(environment, args.cache_ttl, work_dir)
+        # Built after configure() so the tracker picks up the replay settings
+        tracker = ShipTracker()
+        await tracker.start()
+        try:
+            if args.warmup:
+                await tracker.get_ship_status_embed()
+            latencies, errors, elapsed = await drive(tracker, args.concurrency, args.requests, args.duration)
+        finally:
+            await tracker.close()
+            if server is not None:
+                await server.stop()
+
+    latencies.sort()
+    ms = [latency * 1000 for latency in latencies]
+    p95 = percentile(ms, 0.95)
+    print(f"requests     {len(ms)} ({errors} errors) at concurrency {args.concurrency}")
+    print(f"throughput   {len(ms) / elapsed:.1f} req/s over {elapsed:.2f}s")
+    print(f"latency ms   p50 {percentile(ms, 0.50):.1f}  p95 {p95:.1f}  p99 {percentile(ms, 0.99):.1f}  "
+          f"max {ms[-1]:.1f}  mean {statistics.mean(ms):.1f}")
+    print(f"snapshots    {tracker.get_cache_stats()}")
+    print(f"map images   {tracker.map_screenshotter.image_cache.stats()}")
+    if server is not None:
+        print(f"replayed     {server.stats()}")
+
+    if args.max_p95 and p95 > args.max_p95:
+        print(f"FAIL: p95 {p95:.1f} ms is over the {args.max_p95:.1f} ms budget")
+        return 1
+    if args.max_error_rate is not None and errors / len(ms) > args.max_error_rate:
+        print(f"FAIL: error rate {errors / len(ms):.1%} is over {args.max_error_rate:.1%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the ship status path against replayed sites")
+    parser.add_argument('--concurrency', type=int, default=20, help="requests in flight at once")
+    parser.add_argument('--requests', type=int, default=500, help="total requests (ignored with --duration)")
+    parser.add_argument('--duration', type=float, default=0, help="run for this many seconds instead")
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help="snapshot cache TTL; 0 refetches on every request (concurrent ones still coalesce)")
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false', help="time the first, cold request too")
+    parser.add_argument('--target', help="use an already running replay server at this URL")
+    parser.add_argument('--max-p95', type=float, default=0, help="exit 1 if p95 latency exceeds this many ms")
+    parser.add_argument('--max-error-rate', type=float, help="exit 1 if the error share exceeds this (0-1)")
+    parser.add_argument('--verbose', action='store_true', help="show the bot's log output")
+    replay_server.add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    raise SystemExit(asyncio.run(run(args)))
@@ -0,0 +1,73 @@
+"""
+Logging for ship tracking bot
+Log records are queued on the calling thread and written by a background
+listener, so the event loop never blocks on file or console I/O
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that aren't user-supplied extras
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with time, level, logger, message and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def build_file_handler(path, max_bytes, backup_count, rotate_when=None):
+    """Rotate by time when rotate_when is set (e.g. 'midnight', 'H'), otherwise by size"""
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count,
+                                                         encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8', delay=True)
+
+def configure_logging(level='INFO', log_file=None, json_format=False, max_bytes=10 * 1024 * 1024,
+                      backup_count=5, rotate_when=None, console=True):
+    """
+    Route the root logger through a queue to console and (optionally) file handlers
+    Returns the started QueueListener; it is stopped, flushing queued records, at exit
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = []
+    if console:
+        handlers.append(logging.StreamHandler())
+    if log_file:
+        handlers.append(build_file_handler(log_file, max_bytes, backup_count, rotate_when))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    try:
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+    except ValueError:
+        root.setLevel(logging.INFO)
+        root.warning(f"Unknown log level {level!r}, using INFO")
+    atexit.register(listener.stop)
+    return listener
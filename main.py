@@ -1,24 +1,26 @@
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
+import io
 import asyncio
 import logging
 import os
 from datetime import time
-from dotenv import load_dotenv
-from ship_tracker import ShipTracker
+from broadcast import ChannelBroadcaster
+from fleet_tracker import FleetTracker
+from metrics import COMMAND_SECONDS, STAGE_SECONDS, MetricsServer
+from ship_tracker import MAP_FILENAME
 from config import Config
+from log_setup import configure_logging
 
-# Load environment variables
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('whereiscowie.log'),
-        logging.StreamHandler()
-    ]
+# Log records are written by a background thread, off the event loop
+configure_logging(
+    level=Config.LOG_LEVEL,
+    log_file=Config.LOG_FILE,
+    json_format=Config.LOG_FORMAT == 'json',
+    max_bytes=Config.LOG_MAX_BYTES,
+    backup_count=Config.LOG_BACKUP_COUNT,
+    rotate_when=Config.LOG_ROTATE_WHEN
 )
 logger = logging.getLogger(__name__)
 
@@ -31,16 +33,51 @@ class WhereIsCowieBot(commands.Bot):
             intents=intents,
             description="Spirit of Adventure cruise ship tracking bot"
         )
-        self.ship_tracker = ShipTracker()
-        self.auto_update_channel = None
+        self.fleet_tracker = FleetTracker()
+        self.ship_tracker = self.fleet_tracker.default_tracker
+        self.broadcaster = ChannelBroadcaster(Config.BROADCAST_CONCURRENCY, Config.BROADCAST_RATE_LIMIT)
+        self.metrics_server = None
+        # Runs after checks and cooldowns, right before the command itself
+        self.before_invoke(self.start_command_timer)
         
     async def setup_hook(self):
         """Called when the bot is starting up"""
         logger.info("Setting up WhereIsCowieBot...")
+        await self.fleet_tracker.start()
+        # Answer from the snapshots saved before the restart while fresh ones are fetched
+        restored = self.fleet_tracker.restore_snapshots()
+        if restored:
+            logger.info(f"Restored {restored} saved ship snapshots")
+        self.fleet_tracker.register_metrics()
+        if Config.METRICS_PORT > 0:
+            self.metrics_server = MetricsServer(Config.METRICS_HOST, Config.METRICS_PORT)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                # Diagnostics only; e.g. another instance holds the port
+                logger.error(f"Error starting metrics endpoint on port {Config.METRICS_PORT}, running without it: {e}")
+                self.metrics_server = None
+        if Config.SNAPSHOT_POLL_SECONDS > 0:
+            self.ship_tracker.start_polling(Config.SNAPSHOT_POLL_SECONDS)
+        # The application ID is only known once logged in
+        if Config.SYNC_SLASH_COMMANDS and self.application_id is not None:
+            try:
+                synced = await self.tree.sync()
+                logger.info(f"Synced {len(synced)} slash commands")
+            except (discord.HTTPException, discord.ClientException, app_commands.AppCommandError) as e:
+                logger.error(f"Error syncing slash commands: {e}")
         # Start the periodic update task
         if not self.periodic_update.is_running():
             self.periodic_update.start()
     
+    async def close(self):
+        """Called when the bot is shutting down"""
+        logger.info("Shutting down WhereIsCowieBot...")
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.fleet_tracker.close()
+        await super().close()
+    
     async def on_ready(self):
         """Called when the bot is ready"""
         logger.info(f'{self.user} has landed! Connected to {len(self.guilds)} servers.')
@@ -52,8 +89,21 @@ class WhereIsCowieBot(commands.Bot):
         )
         await self.change_presence(activity=activity)
     
+    async def start_command_timer(self, ctx):
+        """Start timing a command; its first response and total time are both measured from here"""
+        ctx.started_at = self.loop.time()
+    
+    async def on_command_completion(self, ctx):
+        self._observe_command(ctx, 'ok')
+    
+    def _observe_command(self, ctx, outcome):
+        started_at = getattr(ctx, 'started_at', None)
+        if ctx.command is not None and started_at is not None:
+            COMMAND_SECONDS.observe(self.loop.time() - started_at, ctx.command.name, outcome)
+    
     async def on_command_error(self, ctx, error):
         """Handle command errors"""
+        self._observe_command(ctx, 'error')
         if isinstance(error, commands.CommandNotFound):
             return
         elif isinstance(error, commands.CommandOnCooldown):
@@ -65,18 +115,16 @@ class WhereIsCowieBot(commands.Bot):
     @tasks.loop(time=[time(6, 0), time(12, 0), time(16, 0)])
     async def periodic_update(self):
         """Send periodic updates about the ship at 06:00, 12:00, and 16:00 UTC"""
-        if self.auto_update_channel:
+        if self.broadcaster:
             try:
-                result = await self.ship_tracker.get_ship_status_embed()
-                
-                # Handle both single embed and embed+file returns
-                if isinstance(result, tuple):
-                    embed, file = result
-                    await self.auto_update_channel.send("🚢 **Scheduled Spirit of Adventure Update**", embed=embed, file=file)
-                else:
-                    embed = result
-                    await self.auto_update_channel.send("🚢 **Scheduled Spirit of Adventure Update**", embed=embed)
-                
+                # Fetch and render once, then fan the same message out to every channel
+                embed, map_image = await self.ship_tracker.get_ship_status_snapshot()
+                await self.broadcaster.broadcast(
+                    "🚢 **Scheduled Spirit of Adventure Update**",
+                    embed,
+                    map_image,
+                    MAP_FILENAME
+                )
                 logger.info("Sent scheduled update")
             except Exception as e:
                 logger.error(f"Error sending scheduled update: {e}")
@@ -84,44 +132,185 @@ class WhereIsCowieBot(commands.Bot):
 # Initialize bot
 bot = WhereIsCowieBot()
 
+def unknown_ship_embed(vessel):
+    """Embed listing the tracked ships when a name or IMO isn't recognised"""
+    embed = discord.Embed(
+        title="❓ Unknown Ship",
+        description=f"I'm not tracking a ship called **{vessel}**.",
+        color=discord.Color.orange()
+    )
+    embed.add_field(
+        name="Tracked Ships",
+        value="\n".join(f"• {v.name} (IMO {v.imo})" for v in list(bot.fleet_tracker.registry)[:20]),
+        inline=False
+    )
+    return embed
+
+def status_error_embed():
+    embed = discord.Embed(
+        title="❌ Error",
+        description="Unable to fetch ship data at the moment. Please try again later.",
+        color=discord.Color.red()
+    )
+    embed.add_field(
+        name="Possible Issues",
+        value="• API service temporarily unavailable\n• Network connectivity issues\n• Ship AIS transponder offline",
+        inline=False
+    )
+    return embed
+
+def map_file(map_image):
+    return discord.File(io.BytesIO(map_image), filename=MAP_FILENAME)
+
+async def send_ship_status(tracker, send, edit, started_at):
+    """
+    Reply with a ship's status. send(embed, file) posts the reply and edit(embed, file)
+    updates it. In progressive mode the data goes out as soon as it has been fetched,
+    and the map is edited in once rendered, or a map link after MAP_DEADLINE_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    embed, map_request = await tracker.build_status_embed()
+    if map_request is None:
+        await send(embed, None)
+        STAGE_SECONDS.observe(loop.time() - started_at, 'first_response', 'discord')
+        return
+    
+    if not Config.PROGRESSIVE_RESPONSES:
+        map_image = await tracker.render_status_map(map_request)
+        tracker.attach_map(embed, map_image)
+        with STAGE_SECONDS.time('send', 'discord'):
+            await send(embed, map_file(map_image) if map_image else None)
+        STAGE_SECONDS.observe(loop.time() - started_at, 'first_response', 'discord')
+        return
+    
+    # Start rendering before the first send so the two overlap
+    render = asyncio.ensure_future(tracker.render_status_map(map_request))
+    embed.add_field(name="🗺️ Map", value="Rendering…", inline=False)
+    placeholder = len(embed.fields) - 1
+    try:
+        with STAGE_SECONDS.time('send', 'discord'):
+            await send(embed, None)
+        STAGE_SECONDS.observe(loop.time() - started_at, 'first_response', 'discord')
+        try:
+            map_image = await asyncio.wait_for(render, Config.MAP_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Map for {tracker.ship_name} not ready after {Config.MAP_DEADLINE_SECONDS}s, sending a link")
+            map_image = None
+    finally:
+        render.cancel()
+    embed.remove_field(placeholder)
+    tracker.attach_map(embed, map_image)
+    with STAGE_SECONDS.time('edit', 'discord'):
+        await edit(embed, map_file(map_image) if map_image else None)
+
 @bot.command(name='cowie', aliases=['ship', 'status', 'location'])
 @commands.cooldown(1, 30, commands.BucketType.user)  # 30 second cooldown per user
-async def get_ship_status(ctx):
-    """Get current status of Spirit of Adventure"""
-    logger.info(f"Ship status requested by {ctx.author} in {ctx.guild}")
+async def get_ship_status(ctx, *, vessel: str = None):
+    """Get current status of Spirit of Adventure, or another tracked ship by name or IMO"""
+    logger.info(f"Ship status requested by {ctx.author} in {ctx.guild} (vessel={vessel})")
+    
+    tracker = bot.fleet_tracker.resolve(vessel)
+    if tracker is None:
+        await ctx.send(embed=unknown_ship_embed(vessel))
+        return
+    
+    message = None
+    
+    async def send(embed, file):
+        nonlocal message
+        message = await (ctx.send(embed=embed, file=file) if file else ctx.send(embed=embed))
+    
+    async def edit(embed, file):
+        await message.edit(embed=embed, attachments=[file] if file else [])
     
     # Send typing indicator
     async with ctx.typing():
         try:
-            result = await bot.ship_tracker.get_ship_status_embed()
-            
-            # Handle both single embed and embed+file returns
-            if isinstance(result, tuple):
-                embed, file = result
-                await ctx.send(embed=embed, file=file)
-            else:
-                embed = result
-                await ctx.send(embed=embed)
-            
+            await send_ship_status(tracker, send, edit, ctx.started_at)
         except Exception as e:
             logger.error(f"Error getting ship status: {e}")
-            error_embed = discord.Embed(
-                title="❌ Error",
-                description="Unable to fetch ship data at the moment. Please try again later.",
-                color=discord.Color.red()
-            )
-            error_embed.add_field(
-                name="Possible Issues",
-                value="• API service temporarily unavailable\n• Network connectivity issues\n• Ship AIS transponder offline",
-                inline=False
-            )
-            await ctx.send(embed=error_embed)
+            if message is None:
+                await ctx.send(embed=status_error_embed())
+
+@bot.tree.command(name='cowie', description="Where is Spirit of Adventure (or another tracked ship) right now?")
+@app_commands.describe(vessel="Ship name, alias or IMO number")
+@app_commands.checks.cooldown(1, 30, key=lambda interaction: interaction.user.id)
+async def slash_ship_status(interaction: discord.Interaction, vessel: str = None):
+    """Slash command version of !cowie, answered through a deferred response"""
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    logger.info(f"Ship status requested by {interaction.user} in {interaction.guild} via slash command (vessel={vessel})")
+    # Acknowledge within Discord's 3 second window; the reply follows by editing it
+    await interaction.response.defer(thinking=True)
+    
+    async def respond(embed, file):
+        await interaction.edit_original_response(embed=embed, attachments=[file] if file else [])
+    
+    outcome = 'ok'
+    try:
+        tracker = bot.fleet_tracker.resolve(vessel)
+        if tracker is None:
+            await respond(unknown_ship_embed(vessel), None)
+        else:
+            await send_ship_status(tracker, respond, respond, started_at)
+    except Exception as e:
+        outcome = 'error'
+        logger.error(f"Error getting ship status: {e}")
+        await respond(status_error_embed(), None)
+    finally:
+        COMMAND_SECONDS.observe(loop.time() - started_at, 'slash_cowie', outcome)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error):
+    """Handle slash command errors"""
+    if isinstance(error, app_commands.CommandOnCooldown):
+        message = f"⏱️ Command on cooldown. Try again in {error.retry_after:.1f}s"
+    else:
+        logger.error(f"Slash command error: {error}")
+        message = "❌ An error occurred while processing your command."
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+@bot.command(name='fleet')
+@commands.cooldown(1, 60, commands.BucketType.channel)
+async def fleet_status(ctx):
+    """Show a position summary for every tracked ship"""
+    logger.info(f"Fleet status requested by {ctx.author} in {ctx.guild}")
+    
+    async with ctx.typing():
+        fleet = bot.fleet_tracker
+        results = await fleet.refresh_all()
+        
+        embed = discord.Embed(
+            title="🚢 Tracked Fleet",
+            description=f"Latest positions for {len(results)} ships",
+            color=discord.Color.blue()
+        )
+        # Discord allows at most 25 fields per embed
+        for vessel in list(fleet.registry)[:25]:
+            data = results.get(vessel.imo, {})
+            if data.get('error'):
+                value = "❌ Data unavailable"
+            else:
+                tracker = fleet.get_tracker(vessel)
+                position = tracker.format_coordinates(data.get('latitude'), data.get('longitude'), data.get('current_location'))
+                value = f"📍 {position}\n💨 {tracker.format_speed(data.get('speed'))}\n🎯 {data.get('destination', 'Unknown')}"
+            embed.add_field(name=f"{vessel.name} ({vessel.imo})", value=value, inline=True)
+        
+        if len(results) > 25:
+            embed.set_footer(text=f"Showing 25 of {len(results)} ships • Use !cowie <name|imo> for details")
+        else:
+            embed.set_footer(text="Use !cowie <name|imo> for details")
+        
+        await ctx.send(embed=embed)
 
 @bot.command(name='track', aliases=['follow'])
 @commands.has_permissions(manage_channels=True)
 async def setup_auto_updates(ctx):
     """Setup automatic updates in current channel (Admin only)"""
-    bot.auto_update_channel = ctx.channel
+    bot.broadcaster.subscribe(ctx.channel)
     
     embed = discord.Embed(
         title="🔔 Auto-Updates Enabled",
@@ -140,22 +329,22 @@ async def setup_auto_updates(ctx):
     )
     
     await ctx.send(embed=embed)
-    logger.info(f"Auto-updates enabled in {ctx.channel} by {ctx.author}")
+    logger.info(f"Auto-updates enabled in {ctx.channel} by {ctx.author} ({len(bot.broadcaster)} channels subscribed)")
 
 @bot.command(name='stop_track', aliases=['unfollow'])
 @commands.has_permissions(manage_channels=True)
 async def disable_auto_updates(ctx):
-    """Disable automatic updates (Admin only)"""
-    bot.auto_update_channel = None
+    """Disable automatic updates in current channel (Admin only)"""
+    bot.broadcaster.unsubscribe(ctx.channel)
     
     embed = discord.Embed(
         title="🔕 Auto-Updates Disabled",
-        description="Periodic updates have been turned off.",
+        description=f"Periodic updates have been turned off in {ctx.channel.mention}.",
         color=discord.Color.orange()
     )
     
     await ctx.send(embed=embed)
-    logger.info(f"Auto-updates disabled by {ctx.author}")
+    logger.info(f"Auto-updates disabled in {ctx.channel} by {ctx.author}")
 
 @bot.command(name='commands')
 async def custom_help(ctx):
@@ -168,7 +357,13 @@ async def custom_help(ctx):
     
     embed.add_field(
         name="🔍 **!cowie** (or !ship, !status, !location)",
-        value="Get current ship location, destination, speed, and ETA",
+        value="Get current ship location, destination, speed, and ETA\nAdd a ship name or IMO to check another tracked ship: `!cowie <name|imo>`",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🛳️ **!fleet**",
+        value="Show positions of every tracked ship",
         inline=False
     )
     
@@ -180,7 +375,7 @@ async def custom_help(ctx):
     
     embed.add_field(
         name="🔕 **!stop_track** (Admin only)",
-        value="Disable automatic updates",
+        value="Disable automatic updates in this channel",
         inline=False
     )
     
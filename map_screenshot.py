@@ -5,24 +5,51 @@ Takes screenshots of ship locations from online maps
 """
 
 import asyncio
+import functools
 import os
 import tempfile
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from concurrent.futures import ThreadPoolExecutor
 import time
 import logging
+from config import Config
+from driver_pool import DriverPool
+from image_cache import RenderedMapCache
+from metrics import STAGE_SECONDS
+from tile_renderer import TileMapRenderer, lat_lon_to_world_pixel
 
 logger = logging.getLogger(__name__)
 
 class MapScreenshotter:
-    def __init__(self):
-        self.driver = None
+    def __init__(self, http_client=None, worker=None):
+        # With a worker, maps are rendered in its process and only cached here
+        self.worker = worker
+        # Selenium calls block, so they run on a dedicated bounded executor.
+        # One spare worker lets broken drivers be quit while the others are busy.
+        self.executor = ThreadPoolExecutor(
+            max_workers=Config.SCREENSHOT_POOL_SIZE + 1,
+            thread_name_prefix="map-screenshot"
+        )
+        self.driver_pool = DriverPool(
+            self.setup_driver,
+            self.run_blocking,
+            max_size=Config.SCREENSHOT_POOL_SIZE,
+            max_uses=Config.SCREENSHOT_DRIVER_MAX_USES
+        )
+        self.tile_renderer = TileMapRenderer(
+            Config.MAP_TILE_URL,
+            Config.MAP_TILE_CACHE_DIR,
+            Config.MAP_TILE_CACHE_MAX_MB * 1024 * 1024,
+            self.run_blocking,
+            http_client=http_client
+        )
+        self.image_cache = RenderedMapCache(Config.MAP_IMAGE_CACHE_MAX_MB * 1024 * 1024)
+        self._inflight_renders = {}
     
     def setup_driver(self):
-        """Setup Chrome driver for screenshots"""
+        """Start a Chrome driver for screenshots, or None if Chrome is unavailable"""
+        # Selenium takes a few hundred milliseconds to import, so only pay for it once a browser is needed
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--no-sandbox")
@@ -32,62 +59,121 @@ class MapScreenshotter:
         chrome_options.add_argument("--disable-software-rasterizer")
         
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            return True
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.set_page_load_timeout(Config.SCREENSHOT_TIMEOUT_SECONDS)
+            return driver
         except Exception as e:
             logger.error(f"Failed to setup Chrome driver: {e}")
-            return False
+            return None
     
-    def close_driver(self):
-        """Close the Chrome driver"""
-        if self.driver:
-            try:
-                self.driver.quit()
-            except Exception as e:
-                logger.error(f"Error closing driver: {e}")
-            self.driver = None
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the screenshot executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+    
+    async def close(self):
+        """Shut down all pooled Chrome drivers and the screenshot executor"""
+        await self.driver_pool.close()
+        await self.tile_renderer.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
     
-    async def get_ship_map_screenshot(self, latitude, longitude, ship_name="Spirit of Adventure"):
+    async def get_ship_map_image(self, latitude, longitude, heading=None):
         """
-        Take a screenshot of the ship's position on a map
-        Returns the file path of the screenshot or None if failed
+        Get a PNG map of the ship's position, served from memory when an
+        image for the same map pixel has already been rendered
+        Returns the PNG bytes or None if failed
         """
         if not latitude or not longitude:
             logger.warning("No coordinates provided for map screenshot")
             return None
         
-        try:
-            # Setup driver
-            if not self.setup_driver():
-                return None
-            
-            # Use OpenStreetMap with marker
-            map_url = f"https://www.openstreetmap.org/?mlat={latitude}&mlon={longitude}&zoom=8#map=8/{latitude}/{longitude}"
+        with STAGE_SECONDS.time('map', Config.MAP_RENDERER):
+            key = self._image_cache_key(latitude, longitude, heading)
+            png_data = self.image_cache.get(key)
+            if png_data is not None:
+                return png_data
             
+            # Share one render between concurrent requests for the same image
+            task = self._inflight_renders.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._render_and_cache(key, latitude, longitude, heading))
+                self._inflight_renders[key] = task
+            return await asyncio.shield(task)
+    
+    def seed_image(self, latitude, longitude, heading, png_data):
+        """Cache a map rendered earlier, e.g. one restored from disk"""
+        self.image_cache.put(self._image_cache_key(latitude, longitude, heading), png_data)
+    
+    def _image_cache_key(self, latitude, longitude, heading):
+        """Quantize a position to the rendered map's pixel grid"""
+        pixel_x, pixel_y = lat_lon_to_world_pixel(latitude, longitude, Config.MAP_ZOOM)
+        heading_bucket = None
+        # Only the tile renderer draws a heading arrow
+        if Config.MAP_RENDERER == 'tiles' and heading is not None:
+            try:
+                heading_bucket = int(round(float(heading) / 5.0)) * 5 % 360
+            except (TypeError, ValueError):
+                pass
+        return (Config.MAP_RENDERER, Config.MAP_ZOOM, int(round(pixel_x)), int(round(pixel_y)), heading_bucket)
+    
+    async def _render_and_cache(self, key, latitude, longitude, heading):
+        """Render a map image with the configured renderer and cache it"""
+        try:
+            if self.worker is not None:
+                png_data = await self._render_in_worker(latitude, longitude, heading)
+            elif Config.MAP_RENDERER == 'tiles':
+                png_data = await self._render_tiles(latitude, longitude, heading)
+            else:
+                png_data = await self._render_browser(latitude, longitude)
+            if png_data:
+                self.image_cache.put(key, png_data)
+            return png_data
+        finally:
+            self._inflight_renders.pop(key, None)
+    
+    async def _render_in_worker(self, latitude, longitude, heading):
+        """Render the map in the worker process"""
+        try:
+            return await self.worker.render(latitude, longitude, heading)
+        except Exception as e:
+            logger.error(f"Error rendering map in worker: {e}")
+            return None
+    
+    async def _render_browser(self, latitude, longitude):
+        """Screenshot OpenStreetMap in a pooled Chrome driver"""
+        try:
             logger.info(f"Taking map screenshot for coordinates: {latitude}, {longitude}")
-            
-            # Load the map
-            self.driver.get(map_url)
-            
-            # Wait for map to load
-            time.sleep(3)
-            
-            # Create temporary file for screenshot
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-            screenshot_path = temp_file.name
-            temp_file.close()
-            
-            # Take screenshot
-            self.driver.save_screenshot(screenshot_path)
-            
-            logger.info(f"Map screenshot saved to: {screenshot_path}")
-            return screenshot_path
-            
+            async with self.driver_pool.acquire() as driver:
+                return await asyncio.wait_for(
+                    self.run_blocking(self._capture_openstreetmap, driver, latitude, longitude),
+                    timeout=Config.SCREENSHOT_TIMEOUT_SECONDS
+                )
+        except asyncio.TimeoutError:
+            logger.error(f"Map screenshot timed out after {Config.SCREENSHOT_TIMEOUT_SECONDS}s")
+            return None
         except Exception as e:
             logger.error(f"Error taking map screenshot: {e}")
             return None
-        finally:
-            self.close_driver()
+    
+    async def _render_tiles(self, latitude, longitude, heading):
+        """Render the ship's position from map tiles without a browser"""
+        try:
+            return await self.tile_renderer.render(latitude, longitude, Config.MAP_ZOOM, heading)
+        except Exception as e:
+            logger.error(f"Error rendering map tiles: {e}")
+            return None
+    
+    async def get_ship_map_screenshot(self, latitude, longitude, ship_name="Spirit of Adventure", heading=None):
+        """
+        Take a screenshot of the ship's position on a map
+        Returns the file path of the screenshot or None if failed
+        """
+        png_data = await self.get_ship_map_image(latitude, longitude, heading)
+        if not png_data:
+            return None
+        screenshot_path = await self.run_blocking(self._write_temp_png, png_data)
+        logger.info(f"Map screenshot saved to: {screenshot_path}")
+        return screenshot_path
     
     async def get_ship_map_screenshot_cruisemapper(self, imo):
         """
@@ -95,50 +181,68 @@ class MapScreenshotter:
         Returns the file path of the screenshot or None if failed
         """
         try:
-            # Setup driver
-            if not self.setup_driver():
-                return None
-            
-            # Use CruiseMapper URL
-            map_url = f"https://www.cruisemapper.com/?imo={imo}"
-            
             logger.info(f"Taking CruiseMapper screenshot for IMO: {imo}")
-            
-            # Load the map
-            self.driver.get(map_url)
-            
-            # Wait for map to load
-            time.sleep(5)
-            
-            # Try to remove any popups or cookie banners
-            try:
-                # Look for common popup/banner close buttons
-                close_buttons = self.driver.find_elements(By.CSS_SELECTOR, "[class*='close'], [class*='dismiss'], [aria-label*='close']")
-                for button in close_buttons[:3]:  # Only try first 3
-                    try:
-                        button.click()
-                        time.sleep(0.5)
-                    except:
-                        pass
-            except:
-                pass
-            
-            # Create temporary file for screenshot
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-            screenshot_path = temp_file.name
-            temp_file.close()
-            
-            # Take screenshot
-            self.driver.save_screenshot(screenshot_path)
-            
+            async with self.driver_pool.acquire() as driver:
+                png_data = await asyncio.wait_for(
+                    self.run_blocking(self._capture_cruisemapper, driver, imo),
+                    timeout=Config.SCREENSHOT_TIMEOUT_SECONDS
+                )
+            screenshot_path = await self.run_blocking(self._write_temp_png, png_data)
             logger.info(f"CruiseMapper screenshot saved to: {screenshot_path}")
             return screenshot_path
-            
+        except asyncio.TimeoutError:
+            logger.error(f"CruiseMapper screenshot timed out after {Config.SCREENSHOT_TIMEOUT_SECONDS}s")
+            return None
         except Exception as e:
             logger.error(f"Error taking CruiseMapper screenshot: {e}")
             return None
-        finally:
-            self.close_driver()
+    
+    def _capture_openstreetmap(self, driver, latitude, longitude):
+        """Load OpenStreetMap with a marker and return a PNG screenshot (blocking)"""
+        # Use OpenStreetMap with marker
+        zoom = Config.MAP_ZOOM
+        map_url = f"https://www.openstreetmap.org/?mlat={latitude}&mlon={longitude}&zoom={zoom}#map={zoom}/{latitude}/{longitude}"
+        
+        # Load the map
+        driver.get(map_url)
+        
+        # Wait for map to load
+        time.sleep(3)
+        
+        return driver.get_screenshot_as_png()
+    
+    def _capture_cruisemapper(self, driver, imo):
+        """Load the CruiseMapper ship page and return a PNG screenshot (blocking)"""
+        from selenium.webdriver.common.by import By
+        # Use CruiseMapper URL
+        map_url = f"https://www.cruisemapper.com/?imo={imo}"
+        
+        # Load the map
+        driver.get(map_url)
+        
+        # Wait for map to load
+        time.sleep(5)
+        
+        # Try to remove any popups or cookie banners
+        try:
+            # Look for common popup/banner close buttons
+            close_buttons = driver.find_elements(By.CSS_SELECTOR, "[class*='close'], [class*='dismiss'], [aria-label*='close']")
+            for button in close_buttons[:3]:  # Only try first 3
+                try:
+                    button.click()
+                    time.sleep(0.5)
+                except:
+                    pass
+        except:
+            pass
+        
+        return driver.get_screenshot_as_png()
+    
+    def _write_temp_png(self, png_data):
+        """Write PNG bytes to a temporary file and return its path (blocking)"""
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
+            temp_file.write(png_data)
+            return temp_file.name
 
 async def test_screenshot():
     """Test the screenshot functionality"""
@@ -147,13 +251,16 @@ async def test_screenshot():
     # Test coordinates (English Channel)
     lat, lon = 47.18238, -7.0743
     
-    screenshot_path = await screenshotter.get_ship_map_screenshot(lat, lon)
-    if screenshot_path:
-        print(f"Screenshot saved to: {screenshot_path}")
-        return screenshot_path
-    else:
-        print("Failed to take screenshot")
-        return None
+    try:
+        screenshot_path = await screenshotter.get_ship_map_screenshot(lat, lon)
+        if screenshot_path:
+            print(f"Screenshot saved to: {screenshot_path}")
+            return screenshot_path
+        else:
+            print("Failed to take screenshot")
+            return None
+    finally:
+        await screenshotter.close()
 
 if __name__ == "__main__":
     asyncio.run(test_screenshot())
\ No newline at end of file
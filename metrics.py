@@ -0,0 +1,204 @@
+"""
+Metrics for ship tracking bot
+Counters, latency histograms and gauges exposed in Prometheus text format
+on a small local HTTP endpoint served from the bot's event loop
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cached answers (sub-millisecond) to slow browser screenshots
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        """Add to the counter for a label combination, given in labelnames order"""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + _format_labels(self.labelnames, labels), value
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        """Record one observation for a label combination, given in labelnames order"""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield self.name + '_bucket' + _format_labels(self.labelnames, labels, f'le="{bound}"'), cumulative
+            yield self.name + '_sum' + _format_labels(self.labelnames, labels), total
+            yield self.name + '_count' + _format_labels(self.labelnames, labels), cumulative
+
+class Gauge:
+    type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        """collect() is called at scrape time and returns {label tuple: value}"""
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        try:
+            values = self.collect() if self.collect else {}
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {e}")
+            return
+        for labels, value in values.items():
+            yield self.name + _format_labels(self.labelnames, labels), value
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """Add a metric, replacing any previous metric of the same name"""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames=(), collect=None):
+        return self.register(Gauge(name, help_text, labelnames, collect))
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {value}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'whereiscowie_stage_seconds',
+    "Time spent in each stage of answering a ship status request",
+    ('stage', 'source')
+)
+SOURCE_RESULTS = REGISTRY.counter(
+    'whereiscowie_source_results_total',
+    "Ship data fetches by source and outcome",
+    ('source', 'outcome')
+)
+HTTP_RESPONSES = REGISTRY.counter(
+    'whereiscowie_http_responses_total',
+    "Outbound HTTP responses by host and status ('error' when no response arrived)",
+    ('host', 'status')
+)
+COMMAND_SECONDS = REGISTRY.histogram(
+    'whereiscowie_command_seconds',
+    "Discord command handling time",
+    ('command', 'outcome')
+)
+
+_caches = {}
+
+def register_cache(name, stats):
+    """Expose a cache's stats() counters as gauges labelled with the cache name"""
+    _caches[name] = stats
+
+def _collect_caches(key):
+    def collect():
+        values = {}
+        for name, stats in _caches.items():
+            counters = stats()
+            value = counters.get(key)
+            if value is None and key == 'hit_ratio' and 'hits' in counters:
+                lookups = counters['hits'] + counters.get('misses', 0)
+                value = counters['hits'] / lookups if lookups else 0.0
+            if value is not None:
+                values[(name,)] = value
+        return values
+    return collect
+
+for _key, _help in (('hits', "Cache hits"), ('misses', "Cache misses"), ('hit_ratio', "Cache hit ratio"),
+                    ('entries', "Entries held in the cache"), ('bytes', "Bytes held in the cache")):
+    REGISTRY.gauge(f'whereiscowie_cache_{_key}', _help, ('cache',), _collect_caches(_key))
+
+class MetricsServer:
+    def __init__(self, host, port, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    async def start(self):
+        """Serve /metrics on the running event loop"""
+        # aiohttp's server side is only loaded when the endpoint is enabled
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        try:
+            await site.start()
+        except OSError:
+            await self.stop()
+            raise
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,266 @@
+"""
+HTML field extraction for ship tracking bot
+Precompiled patterns plus a fast path that only looks at the page regions holding ship data
+"""
+
+import html as html_lib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Characters of raw HTML kept either side of each anchor when scoping regions
+REGION_BEFORE = 400
+REGION_AFTER = 400
+# Occurrences of each anchor considered, outside scripts
+MAX_ANCHOR_HITS = 3
+
+_SCRIPT_BLOCK = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_SCRIPT_TAIL = re.compile(r'<(script|style)\b.*\Z', re.IGNORECASE | re.DOTALL)
+_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_TAG = re.compile(r'<[^>]*>')
+
+# CruiseMapper patterns
+CM_COORDS = re.compile(r'"lat":([\d.-]+),"lon":([\d.-]+)')
+CM_SPEED = re.compile(r'Speed\s*([\d.]+)\s*kn', re.IGNORECASE)
+CM_DEST_ETA = re.compile(r'>\s*([A-Z]{2})\s*([A-Z]{3})\s*ETA([^S]+)')
+CM_ANCHORS = ('Speed', 'ETA')
+
+# VesselFinder patterns
+VF_SPEED = re.compile(r'sailing at a speed of ([\d.]+) knots', re.IGNORECASE)
+VF_DEST = re.compile(r'en route to (?:the port of )?([^,\n]+)', re.IGNORECASE)
+VF_ETA = re.compile(r'expected to arrive there on ([^.\n]+)', re.IGNORECASE)
+VF_LOCATIONS = [
+    re.compile(r'position.*?is\s*at ([^r]+?) reported', re.IGNORECASE),  # Original pattern
+    re.compile(r'(?:is|was)\s*at\s*([^,.]+?)(?:\s*reported|\s*,|\s*\.)', re.IGNORECASE),  # General "at location"
+    re.compile(r'current(?:ly)?\s*(?:in|at)\s*([^,.]+)', re.IGNORECASE),  # "currently in/at location"
+    re.compile(r'(?:sailing|navigating|moving)\s*(?:in|through|at)\s*([^,.]+)', re.IGNORECASE),  # "sailing in location"
+]
+VF_LOCATION_REPORTED = re.compile(r'\s*reported.*')
+VF_LOCATION_BY_AIS = re.compile(r'\s*by AIS.*')
+VF_LAST_UPDATE = re.compile(r'reported ([^b]+?) by AIS', re.IGNORECASE)
+VF_COURSE = re.compile(r'Course / Speed\s*([\d.]+)°', re.IGNORECASE)
+VF_COORDS = [
+    re.compile(r'([\d.]+)°?\s*([NS])[,\s]+([\d.]+)°?\s*([EW])', re.IGNORECASE | re.DOTALL),
+    re.compile(r'Latitude[:\s]*([\d.]+)[°\s]*([NS]).*?Longitude[:\s]*([\d.]+)[°\s]*([EW])', re.IGNORECASE | re.DOTALL),
+    re.compile(r'Lat[:\s]*([\d.]+)[°\s]*([NS]).*?Lon[:\s]*([\d.]+)[°\s]*([EW])', re.IGNORECASE | re.DOTALL),
+]
+VF_ANCHORS = ('position of', 'en route to', 'sailing at a speed', 'expected to arrive', 'Course / Speed', 'Latitude', 'Coordinates')
+
+def soup_text(html):
+    """Full page text via BeautifulSoup (slow path)"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser').get_text()
+
+def _inside_script(html, index):
+    """Check whether index falls inside a <script> or <style> element"""
+    last_open = max(html.rfind('<script', 0, index), html.rfind('<style', 0, index))
+    if last_open == -1:
+        return False
+    last_close = max(html.rfind('</script', 0, index), html.rfind('</style', 0, index))
+    return last_close < last_open
+
+def _script_end(html, index):
+    """Index just past the </script> or </style> tag closing the element at index"""
+    closes = [i for i in (html.find('</script', index), html.find('</style', index)) if i != -1]
+    if not closes:
+        return len(html)
+    return html.find('>', min(closes)) + 1
+
+def _strip_tags(fragment):
+    """Text of an HTML fragment, matching BeautifulSoup's get_text()"""
+    fragment = _SCRIPT_BLOCK.sub('', fragment)
+    fragment = _SCRIPT_TAIL.sub('', fragment)
+    fragment = _COMMENT.sub('', fragment)
+    return html_lib.unescape(_TAG.sub('', fragment))
+
+def _anchor_positions(html, anchors, limit=None):
+    """Sorted (start, end) of the first few occurrences of each literal anchor outside scripts"""
+    positions = []
+    for anchor in anchors:
+        index = html.find(anchor, 0, limit)
+        hits = 0
+        while index != -1 and hits < MAX_ANCHOR_HITS:
+            if not _inside_script(html, index):
+                positions.append((index, index + len(anchor)))
+                hits += 1
+            index = html.find(anchor, index + len(anchor), limit)
+    positions.sort()
+    return positions
+
+def region_text(html, anchors, before=REGION_BEFORE, after=REGION_AFTER, limit=None):
+    """
+    Text of the page regions around literal anchors, without building a DOM.
+    Regions are snapped to tag boundaries, merged when they overlap and
+    joined with newlines so patterns can't run across unrelated regions.
+    Only anchors ending before limit are used.
+    """
+    spans = []
+    for anchor_start, anchor_end in _anchor_positions(html, anchors, limit):
+        start = html.rfind('>', 0, max(anchor_start - before, 0)) + 1
+        if _inside_script(html, start):
+            # Don't let the tail of a script leak into the region text
+            start = _script_end(html, start)
+        end = html.find('<', anchor_end + after)
+        if end == -1:
+            end = len(html)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return '\n'.join(_strip_tags(html[start:end]) for start, end in spans)
+
+def extract_cruisemapper_fields(text, html):
+    """Pull raw CruiseMapper fields out of page text and the raw HTML"""
+    fields = {}
+
+    # Coordinates live in the page's JavaScript config
+    coord_match = CM_COORDS.search(html)
+    if coord_match:
+        fields['latitude'] = float(coord_match.group(1))
+        fields['longitude'] = float(coord_match.group(2))
+
+    # Pattern: "Speed17 kn" or similar
+    speed_match = CM_SPEED.search(text)
+    if speed_match:
+        fields['speed'] = float(speed_match.group(1))
+
+    # Pattern: "GB DVR > GI GIB ETAJuly 27, 05:00"
+    dest_eta_match = CM_DEST_ETA.search(text)
+    if dest_eta_match:
+        fields['dest_country'] = dest_eta_match.group(1)
+        fields['dest_code'] = dest_eta_match.group(2)
+        fields['eta'] = dest_eta_match.group(3).strip()
+
+    return fields
+
+class CruiseMapperStreamExtractor:
+    """
+    Pull CruiseMapper fields out of a page while it downloads. Only a window
+    of recent HTML is kept, so memory stays flat however long the page is.
+    """
+
+    REQUIRED = ('latitude', 'speed', 'dest_code')
+
+    def __init__(self):
+        self.fields = {}
+        self._buffer = ''
+
+    @property
+    def complete(self):
+        """True once every field the bot needs has been found"""
+        return all(key in self.fields for key in self.REQUIRED)
+
+    def feed(self, chunk, final=False):
+        """Add the next piece of decoded HTML; final marks the end of the page"""
+        self._buffer += chunk
+        buffer = self._buffer
+
+        if 'latitude' not in self.fields:
+            coord_match = CM_COORDS.search(buffer)
+            # A match touching the end of the buffer may be a number cut in half
+            if coord_match and (final or coord_match.end() < len(buffer)):
+                self.fields['latitude'] = float(coord_match.group(1))
+                self.fields['longitude'] = float(coord_match.group(2))
+
+        # Anchors are only safe to read once their whole region has arrived
+        if final:
+            limit = len(buffer)
+        else:
+            limit = buffer.rfind('<') - REGION_AFTER
+        if limit > 0 and not ('speed' in self.fields and 'dest_code' in self.fields):
+            text = region_text(buffer, CM_ANCHORS, limit=limit)
+            for key, value in extract_cruisemapper_fields(text, '').items():
+                self.fields.setdefault(key, value)
+
+        self._trim(limit)
+
+    def _trim(self, limit):
+        """Drop HTML that can no longer contribute to a region"""
+        cut = limit - REGION_BEFORE - 64
+        if cut <= 0:
+            return
+        in_script = _inside_script(self._buffer, cut)
+        self._buffer = self._buffer[cut:]
+        if in_script:
+            # Keep script state so its remaining body isn't read as page text
+            self._buffer = '<script>' + self._buffer
+
+def extract_vesselfinder_fields(text):
+    """Pull raw VesselFinder fields out of page text"""
+    fields = {}
+
+    # Pattern: "sailing at a speed of 17.5 knots"
+    speed_match = VF_SPEED.search(text)
+    if speed_match:
+        fields['speed'] = float(speed_match.group(1))
+
+    # Pattern: "en route to the port of Riga, Latvia"
+    dest_match = VF_DEST.search(text)
+    if dest_match:
+        fields['destination'] = dest_match.group(1).strip()
+
+    # Pattern: "expected to arrive there on Jul 16, 09:00"
+    eta_match = VF_ETA.search(text)
+    if eta_match:
+        fields['eta'] = eta_match.group(1).strip()
+
+    for pattern in VF_LOCATIONS:
+        location_match = pattern.search(text)
+        if location_match:
+            location = location_match.group(1).strip()
+            # Clean up common artifacts
+            location = VF_LOCATION_REPORTED.sub('', location)
+            location = VF_LOCATION_BY_AIS.sub('', location)
+            if len(location) > 3 and location.lower() not in ['the', 'and', 'was', 'now']:
+                fields['current_location'] = location
+                break
+
+    # Pattern: "reported 1 min ago"
+    time_match = VF_LAST_UPDATE.search(text)
+    if time_match:
+        fields['last_update'] = time_match.group(1).strip()
+
+    course_match = VF_COURSE.search(text)
+    if course_match:
+        fields['course'] = float(course_match.group(1))
+
+    # Patterns like "59.4237° N, 24.7536° E" or similar
+    for pattern in VF_COORDS:
+        coord_match = pattern.search(text)
+        if coord_match:
+            lat = float(coord_match.group(1))
+            lon = float(coord_match.group(3))
+            if coord_match.group(2).upper() == 'S':
+                lat = -lat
+            if coord_match.group(4).upper() == 'W':
+                lon = -lon
+            fields['latitude'] = lat
+            fields['longitude'] = lon
+            break
+
+    return fields
+
+def parse_cruisemapper_fields(html, fast=True):
+    """
+    Extract CruiseMapper fields, trying the scoped fast path first and
+    falling back to a full BeautifulSoup parse when it comes up short
+    """
+    if fast:
+        fields = extract_cruisemapper_fields(region_text(html, CM_ANCHORS), html)
+        if 'speed' in fields and 'dest_code' in fields:
+            return fields
+        logger.debug("CruiseMapper fast path incomplete, falling back to BeautifulSoup")
+    return extract_cruisemapper_fields(soup_text(html), html)
+
+def parse_vesselfinder_fields(html, fast=True):
+    """
+    Extract VesselFinder fields, trying the scoped fast path first and
+    falling back to a full BeautifulSoup parse when it comes up short
+    """
+    if fast:
+        fields = extract_vesselfinder_fields(region_text(html, VF_ANCHORS))
+        if all(key in fields for key in ('speed', 'destination', 'eta', 'current_location')):
+            return fields
+        logger.debug("VesselFinder fast path incomplete, falling back to BeautifulSoup")
+    return extract_vesselfinder_fields(soup_text(html))
@@ -0,0 +1,96 @@
+"""
+Port lookup for ship tracking bot
+Resolves UN/LOCODE destination codes to port names and coordinates
+"""
+
+import csv
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ports.csv')
+
+def normalize_locode(code):
+    """'GB DVR', 'gb-dvr' and 'GBDVR' all become 'GBDVR'"""
+    return ''.join(ch for ch in str(code) if ch.isalnum()).upper()
+
+class Port:
+    __slots__ = ('locode', 'name', 'latitude', 'longitude')
+
+    def __init__(self, locode, name, latitude, longitude):
+        self.locode = locode
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def country(self):
+        return self.locode[:2]
+
+    def __repr__(self):
+        return f"Port({self.locode!r}, {self.name!r})"
+
+class PortIndex:
+    def __init__(self, ports):
+        self._by_locode = {port.locode: port for port in ports}
+        # Location codes alone are only unique within a country; keep the ones that are unique worldwide
+        self._by_code = {}
+        ambiguous = set()
+        for port in self._by_locode.values():
+            code = port.locode[2:]
+            if code in self._by_code:
+                ambiguous.add(code)
+            self._by_code[code] = port
+        for code in ambiguous:
+            del self._by_code[code]
+
+    @classmethod
+    def load(cls, path=PORTS_FILE):
+        """Load ports from a CSV of locode,name,latitude,longitude"""
+        ports = []
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                ports.append(Port(
+                    normalize_locode(row['locode']),
+                    row['name'],
+                    float(row['latitude']),
+                    float(row['longitude'])
+                ))
+        logger.info(f"Loaded {len(ports)} ports from {path}")
+        return cls(ports)
+
+    def get(self, locode):
+        """Port for a full five-character UN/LOCODE, or None"""
+        return self._by_locode.get(normalize_locode(locode))
+
+    def resolve(self, country, code):
+        """Port for a country and location code, falling back to a worldwide-unique location code"""
+        code = normalize_locode(code)
+        if country:
+            port = self._by_locode.get(normalize_locode(country) + code)
+            if port:
+                return port
+        if len(code) == 5:
+            return self._by_locode.get(code)
+        return self._by_code.get(code)
+
+    def __len__(self):
+        return len(self._by_locode)
+
+_default_index = None
+
+def get_index():
+    """The bundled port index, loaded on first use"""
+    global _default_index
+    if _default_index is None:
+        try:
+            _default_index = PortIndex.load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading ports from {PORTS_FILE}: {e}")
+            _default_index = PortIndex([])
+    return _default_index
+
+def resolve_port(country, code):
+    """Port for a destination's country and location code, or None if unknown"""
+    return get_index().resolve(country, code)
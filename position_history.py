@@ -0,0 +1,223 @@
+"""
+Position history for ship tracking bot
+Append-only fixed-width binary log of every fetched position, one file per vessel,
+read through mmap and searched by timestamp with bisect
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'POSH'
+VERSION = 1
+HEADER = struct.Struct('<4sHH8x')
+# timestamp (epoch seconds), lat/lon (1e-7 degrees), speed (0.1 knots),
+# course (0.1 degrees), status code, source code: 18 bytes per row
+ROW = struct.Struct('<Iiihhbb')
+TIMESTAMP = struct.Struct('<I')
+
+COORD_SCALE = 10_000_000
+UNKNOWN = -1
+
+# Codes are stored on disk, so only ever append to these tables
+STATUSES = (
+    'Under way', 'At anchor', 'Moored', 'Not under command', 'Restricted manoeuvrability',
+    'Constrained by draught', 'Aground', 'Engaged in fishing', 'Under way sailing', 'Other'
+)
+SOURCES = ('cruisemapper', 'vesselfinder', 'marinetraffic', 'Other')
+
+def _code(table, value):
+    if not value:
+        return UNKNOWN
+    for i, name in enumerate(table):
+        if name.lower() == str(value).lower():
+            return i
+    return len(table) - 1
+
+def _tenths(value, limit):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return UNKNOWN
+    if math.isnan(value) or not 0 <= value < limit:
+        return UNKNOWN
+    return round(value * 10)
+
+def pack_row(timestamp, data, source=None):
+    """Encode one position as a fixed-width row"""
+    return ROW.pack(
+        int(timestamp),
+        round(float(data['latitude']) * COORD_SCALE),
+        round(float(data['longitude']) * COORD_SCALE),
+        _tenths(data.get('speed'), 3000),
+        _tenths(data.get('course'), 360),
+        _code(STATUSES, data.get('status')),
+        _code(SOURCES, source or data.get('source'))
+    )
+
+def unpack_row(buffer, offset=0):
+    """Decode a row into a dict using the same keys as ship data"""
+    timestamp, lat, lon, speed, course, status, source = ROW.unpack_from(buffer, offset)
+    return {
+        'timestamp': timestamp,
+        'latitude': lat / COORD_SCALE,
+        'longitude': lon / COORD_SCALE,
+        'speed': speed / 10 if speed != UNKNOWN else None,
+        'course': course / 10 if course != UNKNOWN else None,
+        'status': STATUSES[status] if status != UNKNOWN else None,
+        'source': SOURCES[source] if source != UNKNOWN else None
+    }
+
+class _Timestamps:
+    """Sequence view of the timestamp column of a mapped history file"""
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return TIMESTAMP.unpack_from(self.buffer, HEADER.size + index * ROW.size)[0]
+
+class PositionHistory:
+    def __init__(self, directory):
+        self.directory = directory
+        # Last timestamp written per vessel; rows must stay in time order for bisect
+        self._last = {}
+        self.appended = 0
+        self.skipped = 0
+
+    def _path(self, imo):
+        return os.path.join(self.directory, f"{imo}.pos")
+
+    def record(self, imo, data, source=None, timestamp=None):
+        """
+        Append a position for a vessel
+        Returns False for data without coordinates or not newer than the last row
+        """
+        if data.get('error') or data.get('latitude') is None or data.get('longitude') is None:
+            return False
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        last = self._last.get(imo)
+        if last is None:
+            try:
+                last = self._last[imo] = self._read_last_timestamp(imo)
+            except OSError as e:
+                # Don't append to a file that can't be read back
+                logger.error(f"Not recording position for IMO {imo}: {e}")
+                return False
+        if last is not None and timestamp <= last:
+            self.skipped += 1
+            return False
+
+        try:
+            row = pack_row(timestamp, data, source)
+        except (TypeError, ValueError, struct.error) as e:
+            logger.warning(f"Not recording position for IMO {imo}: {e}")
+            return False
+
+        path = self._path(imo)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'ab') as f:
+                size = f.tell()
+                if size < HEADER.size:
+                    f.truncate(0)
+                    f.write(HEADER.pack(MAGIC, VERSION, ROW.size))
+                elif (size - HEADER.size) % ROW.size:
+                    # Drop a row torn by an interrupted write so new rows stay aligned
+                    f.truncate(size - (size - HEADER.size) % ROW.size)
+                f.write(row)
+        except OSError as e:
+            logger.error(f"Error writing position history {path}: {e}")
+            return False
+
+        self._last[imo] = timestamp
+        self.appended += 1
+        return True
+
+    def _read_last_timestamp(self, imo):
+        """Timestamp of the last complete row, or None; raises OSError for an unreadable file"""
+        try:
+            with open(self._path(imo), 'rb') as f:
+                count = self._count(f)
+                if not count:
+                    return None
+                f.seek(HEADER.size + (count - 1) * ROW.size)
+                return TIMESTAMP.unpack(f.read(TIMESTAMP.size))[0]
+        except FileNotFoundError:
+            return None
+
+    def _count(self, f):
+        """Validate the header and return the number of complete rows"""
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return 0
+        f.seek(0)
+        magic, version, row_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or row_size != ROW.size:
+            raise OSError(f"unsupported position history format in {f.name}")
+        # A torn final write leaves a partial row, which is ignored
+        return (size - HEADER.size) // ROW.size
+
+    def range(self, imo, start=None, end=None, limit=None):
+        """
+        Positions with start <= timestamp <= end, oldest first
+        With limit, only the newest rows in the range are returned
+        """
+        path = self._path(imo)
+        try:
+            with open(path, 'rb') as f:
+                count = self._count(f)
+                if not count:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    timestamps = _Timestamps(buffer, count)
+                    lo = bisect_left(timestamps, start) if start is not None else 0
+                    hi = bisect_right(timestamps, end) if end is not None else count
+                    if limit is not None:
+                        lo = max(lo, hi - limit)
+                    return [unpack_row(buffer, HEADER.size + i * ROW.size) for i in range(lo, hi)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            # One unreadable file mustn't fail every fetch for the vessel
+            logger.error(f"Error reading position history {path}: {e}")
+            return []
+
+    def at(self, imo, timestamp):
+        """The last position recorded at or before timestamp, or None"""
+        rows = self.range(imo, end=timestamp, limit=1)
+        return rows[0] if rows else None
+
+    def latest(self, imo):
+        """The most recent position recorded for a vessel, or None"""
+        rows = self.range(imo, limit=1)
+        return rows[0] if rows else None
+
+    def count(self, imo):
+        """Number of positions recorded for a vessel"""
+        try:
+            with open(self._path(imo), 'rb') as f:
+                return self._count(f)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"Error reading position history {self._path(imo)}: {e}")
+            return 0
+
+    def stats(self):
+        """Get write counters"""
+        return {
+            'appended': self.appended,
+            'skipped': self.skipped,
+            'vessels': len(self._last)
+        }
@@ -0,0 +1,50 @@
+"""
+Rate limiting for ship tracking bot
+Token buckets that space out outbound requests per data source
+"""
+
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available now, without waiting"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Wait until a request may be made, then take a token"""
+        async with self._lock:
+            while not self.try_acquire():
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class RateLimiter:
+    def __init__(self, limits):
+        # limits maps a key to (requests per second, burst); unknown keys are unlimited
+        self.limits = limits
+        self._buckets = {}
+
+    async def acquire(self, key):
+        """Wait for the bucket for key, if it has a limit"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            limit = self.limits.get(key)
+            if not limit or limit[0] <= 0:
+                return
+            bucket = self._buckets[key] = TokenBucket(*limit)
+        await bucket.acquire()
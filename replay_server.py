@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Replay server for ship tracking bot
+A local stand-in for CruiseMapper, VesselFinder, MarineTraffic and the map tile
+server that answers from the recordings in fixtures/, with configurable latency,
+errors and throttling so the bot can be exercised and timed offline
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import io
+import os
+import random
+from collections import Counter
+from aiohttp import web
+from PIL import Image, ImageDraw
+from rate_limit import TokenBucket
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+SOURCES = ('cruisemapper', 'vesselfinder', 'marinetraffic', 'tiles')
+
+class Recording:
+    def __init__(self, name, body, content_type):
+        self.name = name
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+def replay_environment(base_url):
+    """Settings that point the bot at a replay server"""
+    base_url = base_url.rstrip('/')
+    return {
+        'CRUISEMAPPER_BASE_URL': base_url,
+        'VESSELFINDER_BASE_URL': base_url,
+        'MARINETRAFFIC_BASE_URL': base_url,
+        'MAP_RENDERER': 'tiles',
+        'MAP_TILE_URL': base_url + '/tiles/{z}/{x}/{y}.png',
+    }
+
+def load_recordings(fixture_dir, source, pattern, content_type):
+    """Recordings for a source, sorted by file name"""
+    recordings = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, source, pattern))):
+        with open(path, 'rb') as f:
+            recordings.append(Recording(os.path.basename(path), f.read(), content_type))
+    return recordings
+
+class ReplayServer:
+    def __init__(self, host='127.0.0.1', port=8089, fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle=0.0, down=(), scenario=None, rotate=False, seed=None):
+        """
+        latency and jitter are seconds added to every response; error_rate is the share
+        answered with a 503; throttle is requests per second per source beyond which a 429
+        is returned (0 = unlimited); sources in down always answer 503. scenario picks the
+        fixtures whose name contains it, and rotate cycles through them per request.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.down = set(down)
+        self.rotate = rotate
+        self.random = random.Random(seed)
+        self.recordings = {
+            'cruisemapper': load_recordings(fixture_dir, 'cruisemapper', '*.html', 'text/html'),
+            'vesselfinder': load_recordings(fixture_dir, 'vesselfinder', '*.html', 'text/html'),
+            'marinetraffic': load_recordings(fixture_dir, 'marinetraffic', '*.json', 'application/json'),
+        }
+        if scenario:
+            for source, recordings in self.recordings.items():
+                self.recordings[source] = [r for r in recordings if scenario in r.name] or recordings
+        self._buckets = {source: TokenBucket(throttle, max(1, int(throttle))) for source in SOURCES} if throttle > 0 else {}
+        self._served = Counter()
+        self._tiles = {}
+        self.requests = Counter()
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def environment(self):
+        """Settings that point the bot at this server"""
+        return replay_environment(self.base_url)
+
+    def build_app(self):
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get('/', self.handle_cruisemapper)
+        app.router.add_get('/vessels/details/{imo}', self.handle_vesselfinder)
+        app.router.add_get('/api/pro/ais/{imo}', self.handle_vesselfinder_api)
+        app.router.add_get('/api/exportvessel/{query:.*}', self.handle_marinetraffic)
+        app.router.add_get('/tiles/{z}/{x}/{y}.png', self.handle_tile)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            # Report the port the OS picked
+            self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    def _source(request):
+        path = request.path
+        if path.startswith('/tiles/'):
+            return 'tiles'
+        if path.startswith('/api/exportvessel/'):
+            return 'marinetraffic'
+        if path.startswith(('/vessels/', '/api/pro/')):
+            return 'vesselfinder'
+        return 'cruisemapper'
+
+    @web.middleware
+    async def faults(self, request, handler):
+        """Apply the configured latency, outages, throttling and random errors"""
+        source = self._source(request)
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if source in self.down or (self.error_rate and self.random.random() < self.error_rate):
+            response = web.Response(status=503, text="Service Unavailable")
+        elif self._buckets and not self._buckets[source].try_acquire():
+            response = web.Response(status=429, text="Too Many Requests", headers={'Retry-After': '1'})
+        else:
+            response = await handler(request)
+        self.requests[(source, response.status)] += 1
+        return response
+
+    def _recording(self, source):
+        recordings = self.recordings[source]
+        if not recordings:
+            return None
+        if not self.rotate:
+            return recordings[0]
+        index = self._served[source] % len(recordings)
+        self._served[source] += 1
+        return recordings[index]
+
+    def _replay(self, request, source):
+        recording = self._recording(source)
+        if recording is None:
+            return web.Response(status=404, text=f"No {source} recordings")
+        if request.headers.get('If-None-Match') == recording.etag:
+            return web.Response(status=304, headers={'ETag': recording.etag})
+        return web.Response(body=recording.body, content_type=recording.content_type,
+                            charset='utf-8', headers={'ETag': recording.etag})
+
+    async def handle_cruisemapper(self, request):
+        if 'imo' not in request.query:
+            return web.Response(status=404, text="Not Found")
+        return self._replay(request, 'cruisemapper')
+
+    async def handle_vesselfinder(self, request):
+        return self._replay(request, 'vesselfinder')
+
+    async def handle_vesselfinder_api(self, request):
+        # No API recordings; behave like a rejected key so the bot falls back to the page
+        return web.Response(status=401, text="Unauthorized")
+
+    async def handle_marinetraffic(self, request):
+        return self._replay(request, 'marinetraffic')
+
+    async def handle_tile(self, request):
+        z, x, y = (int(request.match_info[key]) for key in ('z', 'x', 'y'))
+        return web.Response(body=self._tile(z, x, y), content_type='image/png')
+
+    def _tile(self, z, x, y):
+        """A plain sea-coloured tile with a border, checkerboarded so tile seams show"""
+        key = (x + y) % 2
+        tile = self._tiles.get(key)
+        if tile is None:
+            image = Image.new('RGB', (256, 256), (170, 211, 223) if key else (165, 205, 218))
+            ImageDraw.Draw(image).rectangle((0, 0, 255, 255), outline=(150, 190, 205))
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            tile = self._tiles[key] = buffer.getvalue()
+        return tile
+
+    def stats(self):
+        """Responses served, keyed by 'source status'"""
+        return {f"{source} {status}": count for (source, status), count in sorted(self.requests.items())}
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random +/- seconds on top of --latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of responses answered with 503")
+    parser.add_argument('--throttle', type=float, default=0.0, help="requests per second per source before 429s (0 = off)")
+    parser.add_argument('--down', action='append', default=[], choices=SOURCES, help="source that always answers 503")
+    parser.add_argument('--scenario', help="only replay fixtures whose file name contains this")
+    parser.add_argument('--rotate', action='store_true', help="cycle through the fixtures on each request")
+    parser.add_argument('--seed', type=int, help="random seed for jitter and errors")
+
+def server_from_args(args, host='127.0.0.1', port=0):
+    return ReplayServer(host, port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        throttle=args.throttle, down=args.down, scenario=args.scenario,
+                        rotate=args.rotate, seed=args.seed)
+
+async def serve(args):
+    server = server_from_args(args, args.host, args.port)
+    await server.start()
+    print(f"Replaying fixtures on {server.base_url} - point the bot at it with:")
+    for key, value in server.environment().items():
+        print(f"  {key}={value}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(server.stats())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded ship tracking pages locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,141 @@
+"""
+Sea area naming for ship tracking bot
+Finds the named sea or ocean containing a position using bundled coarse polygons
+and a uniform grid of candidate polygons per cell
+"""
+
+import json
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+SEA_AREAS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sea_areas.json')
+
+def _ring_area(ring):
+    """Planar area of a lon/lat ring in square degrees"""
+    area = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        area += x1 * y2 - x2 * y1
+    return abs(area) / 2
+
+def _contains(ring, lon, lat):
+    """Ray-casting point-in-polygon test"""
+    inside = False
+    x2, y2 = ring[-1]
+    for x1, y1 in ring:
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x2, y2 = x1, y1
+    return inside
+
+def _edge_distance(ring, lon, lat):
+    """Distance in degrees from a point to a ring's nearest edge, with longitude scaled by latitude"""
+    scale = max(math.cos(math.radians(lat)), 0.01)
+    best = float('inf')
+    x2, y2 = ring[-1]
+    for x1, y1 in ring:
+        # Project onto the segment in a locally scaled plane
+        ax, ay = (x1 - lon) * scale, y1 - lat
+        bx, by = (x2 - lon) * scale, y2 - lat
+        dx, dy = bx - ax, by - ay
+        length = dx * dx + dy * dy
+        t = 0.0 if length == 0 else min(max(-(ax * dx + ay * dy) / length, 0.0), 1.0)
+        best = min(best, math.hypot(ax + t * dx, ay + t * dy))
+        x2, y2 = x1, y1
+    return best
+
+class SeaAreaIndex:
+    def __init__(self, areas, cell_size=2.0, max_gap=1.0):
+        """
+        areas is a list of {"name", "polygons"} with each polygon a list of [lon, lat].
+        Where areas overlap, the smallest polygon wins, so seas take precedence over oceans.
+        A position outside every polygon, such as a port up an estuary, is named after the
+        nearest polygon within max_gap degrees (about 60 nm per degree).
+        """
+        self.cell_size = cell_size
+        self.max_gap = max_gap
+        # Fallback answers by position rounded to about a kilometre; ports repeat
+        self._nearby = {}
+        polygons = []
+        for area in areas:
+            for ring in area['polygons']:
+                ring = [(float(lon), float(lat)) for lon, lat in ring]
+                polygons.append((_ring_area(ring), area['name'], ring))
+        polygons.sort(key=lambda polygon: polygon[0])
+        self.polygons = [(name, ring) for _, name, ring in polygons]
+
+        # Each grid cell lists the polygons whose bounding box touches it, smallest first
+        self._grid = {}
+        for index, (_, ring) in enumerate(self.polygons):
+            lons = [lon for lon, _ in ring]
+            lats = [lat for _, lat in ring]
+            for cx in range(self._cell(min(lons)), self._cell(max(lons)) + 1):
+                for cy in range(self._cell(min(lats)), self._cell(max(lats)) + 1):
+                    self._grid.setdefault((cx, cy), []).append(index)
+
+    def _cell(self, degrees):
+        return math.floor(degrees / self.cell_size)
+
+    @classmethod
+    def load(cls, path=SEA_AREAS_FILE):
+        """Build an index from a JSON area file"""
+        with open(path, encoding='utf-8') as f:
+            areas = json.load(f)
+        index = cls(areas)
+        logger.info(f"Loaded {len(index.polygons)} sea area polygons from {path}")
+        return index
+
+    def covers(self, latitude, longitude):
+        """Whether a position lies inside any sea area polygon"""
+        lon = (longitude + 180) % 360 - 180 if not -180 <= longitude <= 180 else longitude
+        return any(_contains(self.polygons[index][1], lon, latitude)
+                   for index in self._grid.get((self._cell(lon), self._cell(latitude)), ()))
+
+    def lookup(self, latitude, longitude):
+        """Name of the sea area containing a position, else of the nearest one within max_gap, or None"""
+        lon = (longitude + 180) % 360 - 180 if not -180 <= longitude <= 180 else longitude
+        for index in self._grid.get((self._cell(lon), self._cell(latitude)), ()):
+            name, ring = self.polygons[index]
+            if _contains(ring, lon, latitude):
+                return name
+        key = (round(latitude, 2), round(lon, 2))
+        if key not in self._nearby:
+            if len(self._nearby) >= 4096:
+                self._nearby.clear()
+            self._nearby[key] = self.nearest(latitude, lon)
+        return self._nearby[key]
+
+    def nearest(self, latitude, longitude):
+        """Name of the polygon closest to a position within max_gap, or None (slow path)"""
+        lon_gap = self.max_gap / max(math.cos(math.radians(latitude)), 0.01)
+        candidates = set()
+        for cx in range(self._cell(longitude - lon_gap), self._cell(longitude + lon_gap) + 1):
+            for cy in range(self._cell(latitude - self.max_gap), self._cell(latitude + self.max_gap) + 1):
+                candidates.update(self._grid.get((cx, cy), ()))
+        best_name, best_distance = None, self.max_gap
+        # Indices run smallest polygon first, so a sea beats an ocean at the same distance
+        for index in sorted(candidates):
+            name, ring = self.polygons[index]
+            distance = _edge_distance(ring, longitude, latitude)
+            if distance < best_distance:
+                best_name, best_distance = name, distance
+        return best_name
+
+_default_index = None
+
+def get_index():
+    """The bundled sea area index, built on first use"""
+    global _default_index
+    if _default_index is None:
+        try:
+            _default_index = SeaAreaIndex.load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading sea areas from {SEA_AREAS_FILE}: {e}")
+            _default_index = SeaAreaIndex([])
+    return _default_index
+
+def sea_area_name(latitude, longitude):
+    """Name of the sea area containing a position, or None if unknown"""
+    return get_index().lookup(latitude, longitude)
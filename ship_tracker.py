@@ -1,49 +1,174 @@
-import aiohttp
 import asyncio
+import codecs
 import discord
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import io
 import json
-import os
-import re
-from bs4 import BeautifulSoup
+import time
 from config import Config
+from dead_reckoning import distance_nm, estimate_positions, initial_bearing
+from http_client import HttpClient
+import page_parsers
 from map_screenshot import MapScreenshotter
+from metrics import SOURCE_RESULTS, STAGE_SECONDS
+from ports import resolve_port
+from position_history import PositionHistory
+from sea_areas import sea_area_name
+from snapshot_cache import SnapshotCache
+from snapshot_store import SnapshotStore
+from source_health import SourceError, SourceHealthMonitor
+from vessels import Vessel
+from voyage import VoyageEstimator
+from worker import WorkerError
 
 logger = logging.getLogger(__name__)
 
+MAP_FILENAME = "ship_location_map.png"
+
+def estimate_current_positions(snapshots):
+    """Dead-reckon snapshots forward to now within the configured limits"""
+    if not Config.ENABLE_DEAD_RECKONING:
+        return list(snapshots)
+    return estimate_positions(
+        snapshots,
+        min_age=Config.DEAD_RECKONING_MIN_SECONDS,
+        max_age=Config.DEAD_RECKONING_MAX_SECONDS
+    )
+
+def has_ship_data(data):
+    """
+    Whether parsed data is usable: a position, or at least speed and destination
+    An empty or challenge page parses without error but carries neither
+    """
+    if not data or data.get('error'):
+        return False
+    if isinstance(data.get('latitude'), (int, float)) and isinstance(data.get('longitude'), (int, float)):
+        return True
+    return data.get('speed') is not None and bool(data.get('destination'))
+
+def create_source_health():
+    """Source health tracking configured from Config"""
+    return SourceHealthMonitor(
+        failure_threshold=Config.SOURCE_FAILURE_THRESHOLD,
+        open_seconds=Config.SOURCE_OPEN_SECONDS,
+        max_open_seconds=Config.SOURCE_MAX_OPEN_SECONDS
+    )
+
 class ShipTracker:
-    def __init__(self):
-        self.ship_imo = "9818084"
-        self.ship_mmsi = "232026551"
-        self.ship_name = "SPIRIT OF ADVENTURE"
-        self.session = None
-        self.map_screenshotter = MapScreenshotter()
-        
-    async def get_session(self):
-        """Get or create aiohttp session"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30),
-                headers={'User-Agent': 'WhereIsCowieBot/1.0'}
-            )
-        return self.session
+    def __init__(self, vessel=None, fleet=None):
+        vessel = vessel or Vessel.default()
+        self.vessel = vessel
+        self.ship_imo = vessel.imo
+        self.ship_mmsi = vessel.mmsi
+        self.ship_name = vessel.name
+        # Trackers in a fleet share its HTTP client, caches and browsers
+        self.fleet = fleet
+        if fleet is not None:
+            self.http_client = fleet.http_client
+            self.map_screenshotter = fleet.map_screenshotter
+            self.snapshot_cache = fleet.snapshot_cache
+            self.position_history = fleet.position_history
+            self.voyage_estimator = fleet.voyage_estimator
+            self.source_health = fleet.source_health
+            self.snapshot_store = fleet.snapshot_store
+            self.worker = fleet.worker
+        else:
+            self.http_client = HttpClient()
+            self.map_screenshotter = MapScreenshotter(self.http_client)
+            self.snapshot_cache = SnapshotCache(Config.SNAPSHOT_CACHE_TTL, Config.SNAPSHOT_MAX_STALE)
+            self.position_history = PositionHistory(Config.POSITION_HISTORY_DIR)
+            self.voyage_estimator = VoyageEstimator(self.position_history)
+            self.source_health = create_source_health()
+            self.snapshot_store = SnapshotStore(Config.SNAPSHOT_STORE_DIR, Config.SNAPSHOT_STORE_MAPS)
+            self.worker = None
+        self._poll_task = None
+    
+    async def start(self):
+        """Open the HTTP connection pool"""
+        await self.http_client.start()
+    
+    def start_polling(self, interval):
+        """Refresh the snapshot in the background every interval seconds"""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll(interval))
     
-    async def close_session(self):
-        """Close aiohttp session"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+    async def stop_polling(self):
+        """Stop the background refresh task"""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+    
+    async def _poll(self, interval):
+        logger.info(f"Polling {self.ship_name} every {interval:.0f}s")
+        while True:
+            try:
+                data = await self.refresh_snapshot()
+                if data is None or data.get('error'):
+                    logger.warning(f"Background refresh of {self.ship_name} failed, keeping last good snapshot")
+            except Exception as e:
+                logger.error(f"Error in background refresh of {self.ship_name}: {e}")
+            await asyncio.sleep(interval)
+    
+    async def refresh_snapshot(self):
+        """Fetch fresh data into the snapshot cache now, joining a fetch already in flight"""
+        return await self.snapshot_cache.refresh(self.ship_imo, self._fetch_ais_data_uncached)
+    
+    def restore_snapshot(self, prefetch=True):
+        """
+        Seed the caches with the snapshot and map saved before the last restart and, with
+        prefetch, fetch fresh data in the background. Returns True if a snapshot was restored.
+        """
+        if not Config.ENABLE_SNAPSHOT_STORE:
+            return False
+        snapshot, saved_at = self.snapshot_store.load(self.ship_imo)
+        if snapshot is None:
+            return False
+        fetched_at = snapshot.get('fetched_at') or saved_at
+        age = time.time() - fetched_at
+        # Flagged so the embed shows its age until a fresh fetch replaces it
+        self.snapshot_cache.seed(self.ship_imo, dict(snapshot, fetched_at=fetched_at, restored=True), age)
+        saved_map = self.snapshot_store.load_map(self.ship_imo)
+        if saved_map is not None:
+            self.map_screenshotter.seed_image(*saved_map)
+        logger.info(f"Restored {self.ship_name} snapshot from {self.format_age(age)} ago")
+        if prefetch:
+            self.snapshot_cache.prefetch(self.ship_imo, self._fetch_ais_data_uncached)
+        return True
+    
+    async def _persist(self, save, *args):
+        """Write to the snapshot store off the event loop; failures are logged, not raised"""
+        if not Config.ENABLE_SNAPSHOT_STORE:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, save, self.ship_imo, *args)
+        except Exception as e:
+            logger.error(f"Error saving {self.ship_name} snapshot: {e}")
+    
+    async def close(self):
+        """Release the HTTP connection pool and pooled screenshot browsers"""
+        await self.stop_polling()
+        if self.fleet is not None:
+            # Shared resources are released by the fleet
+            return
+        await self.http_client.close()
+        await self.map_screenshotter.close()
     
     async def fetch_vesselfinder_data(self):
-        """Fetch ship data from VesselFinder website"""
-        session = await self.get_session()
-        
+        """
+        Fetch ship data from VesselFinder website, or None if it has no page for the ship
+        Raises SourceError if the site can't be reached, errors or sends an unparseable page
+        """
         # Try API first if key is available
         if Config.VESSELFINDER_API_KEY:
-            url = f"https://www.vesselfinder.com/api/pro/ais/{self.ship_imo}"
+            url = f"{Config.VESSELFINDER_BASE_URL}/api/pro/ais/{self.ship_imo}"
             try:
                 headers = {'Authorization': f'Bearer {Config.VESSELFINDER_API_KEY}'}
-                async with session.get(url, headers=headers) as response:
+                async with self.http_client.get(url, headers=headers) as response:
                     if response.status == 200:
                         data = await response.json()
                         return data
@@ -54,7 +179,7 @@ class ShipTracker:
         
         # Fallback to public page scraping with browser headers
         try:
-            url = f"https://www.vesselfinder.com/vessels/details/{self.ship_imo}"
+            url = f"{Config.VESSELFINDER_BASE_URL}/vessels/details/{self.ship_imo}"
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -63,24 +188,23 @@ class ShipTracker:
                 'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1',
             }
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    logger.info(f"Successfully fetched VesselFinder page for IMO {self.ship_imo}")
-                    return self.parse_vesselfinder_html(html)
-                else:
-                    logger.warning(f"VesselFinder website returned status {response.status}")
-                    return None
+            status, html = await self.http_client.fetch_text(url, headers=headers)
         except Exception as e:
-            logger.error(f"Error fetching VesselFinder website data: {e}")
+            raise SourceError(f"Error fetching VesselFinder website data: {e}") from e
+        if status == 404:
+            logger.warning(f"VesselFinder has no page for IMO {self.ship_imo}")
             return None
+        if status != 200:
+            raise SourceError(f"VesselFinder website returned status {status}")
+        logger.info(f"Successfully fetched VesselFinder page for IMO {self.ship_imo}")
+        data = self.parse_vesselfinder_html(html)
+        if data is None:
+            raise SourceError("Error parsing VesselFinder page")
+        return data
     
     def parse_vesselfinder_html(self, html):
         """Parse VesselFinder HTML page for ship data"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            text_content = soup.get_text()
-            
             # Extract ship data using the proven working patterns
             data = {
                 'ship_name': self.ship_name,
@@ -88,80 +212,13 @@ class ShipTracker:
                 'mmsi': self.ship_mmsi,
                 'error': False
             }
-            
-            # Extract speed - pattern: "sailing at a speed of 17.5 knots"
-            speed_match = re.search(r'sailing at a speed of ([\d.]+) knots', text_content, re.IGNORECASE)
-            if speed_match:
-                data['speed'] = float(speed_match.group(1))
-            
-            # Extract destination - pattern: "en route to the port of Riga, Latvia"
-            dest_match = re.search(r'en route to (?:the port of )?([^,\n]+)', text_content, re.IGNORECASE)
-            if dest_match:
-                data['destination'] = dest_match.group(1).strip()
-            
-            # Extract ETA - pattern: "expected to arrive there on Jul 16, 09:00"
-            eta_match = re.search(r'expected to arrive there on ([^.\n]+)', text_content, re.IGNORECASE)
-            if eta_match:
-                data['eta'] = eta_match.group(1).strip()
-            
-            # Extract current location - multiple patterns
-            location_patterns = [
-                r'position.*?is\s*at ([^r]+?) reported',  # Original pattern
-                r'(?:is|was)\s*at\s*([^,.]+?)(?:\s*reported|\s*,|\s*\.)',  # General "at location"
-                r'current(?:ly)?\s*(?:in|at)\s*([^,.]+)',  # "currently in/at location"
-                r'(?:sailing|navigating|moving)\s*(?:in|through|at)\s*([^,.]+)',  # "sailing in location"
-            ]
-            
-            for pattern in location_patterns:
-                location_match = re.search(pattern, text_content, re.IGNORECASE)
-                if location_match:
-                    location = location_match.group(1).strip()
-                    # Clean up common artifacts
-                    location = re.sub(r'\s*reported.*', '', location)
-                    location = re.sub(r'\s*by AIS.*', '', location)
-                    if len(location) > 3 and location.lower() not in ['the', 'and', 'was', 'now']:
-                        data['current_location'] = location
-                        break
-            
-            # Extract last update time - pattern: "reported 1 min ago"
-            time_match = re.search(r'reported ([^b]+?) by AIS', text_content, re.IGNORECASE)
-            if time_match:
-                data['last_update'] = time_match.group(1).strip()
+            with STAGE_SECONDS.time('parse', 'vesselfinder'):
+                data.update(page_parsers.parse_vesselfinder_fields(html, fast=Config.ENABLE_FAST_PARSERS))
             
             # Set status as "Under way" if we have speed and destination
             if data.get('speed') and data.get('destination'):
                 data['status'] = 'Under way'
             
-            # Extract course and coordinates from the table data
-            course_match = re.search(r'Course / Speed\s*([\d.]+)°', text_content, re.IGNORECASE)
-            if course_match:
-                data['course'] = float(course_match.group(1))
-            
-            # Extract coordinates from latitude/longitude patterns in the page
-            # Look for patterns like "59.4237° N, 24.7536° E" or similar
-            coord_patterns = [
-                r'([\d.]+)°?\s*([NS])[,\s]+([\d.]+)°?\s*([EW])',
-                r'Latitude[:\s]*([\d.]+)[°\s]*([NS]).*?Longitude[:\s]*([\d.]+)[°\s]*([EW])',
-                r'Lat[:\s]*([\d.]+)[°\s]*([NS]).*?Lon[:\s]*([\d.]+)[°\s]*([EW])'
-            ]
-            
-            for pattern in coord_patterns:
-                coord_match = re.search(pattern, text_content, re.IGNORECASE | re.DOTALL)
-                if coord_match:
-                    lat = float(coord_match.group(1))
-                    lat_dir = coord_match.group(2).upper()
-                    lon = float(coord_match.group(3))
-                    lon_dir = coord_match.group(4).upper()
-                    
-                    if lat_dir == 'S':
-                        lat = -lat
-                    if lon_dir == 'W':
-                        lon = -lon
-                    
-                    data['latitude'] = lat
-                    data['longitude'] = lon
-                    break
-            
             logger.info(f"Parsed ship data: speed={data.get('speed')}, dest={data.get('destination')}, eta={data.get('eta')}")
             return data
             
@@ -171,13 +228,11 @@ class ShipTracker:
     
     async def fetch_marinetraffic_data(self):
         """Fetch ship data from MarineTraffic API as fallback"""
-        session = await self.get_session()
-        
         # Try public AIS data endpoint
-        url = f"https://services.marinetraffic.com/api/exportvessel/v:8/{Config.MARINETRAFFIC_API_KEY}/protocol:jsono/imo:{self.ship_imo}"
+        url = f"{Config.MARINETRAFFIC_BASE_URL}/api/exportvessel/v:8/{Config.MARINETRAFFIC_API_KEY}/protocol:jsono/imo:{self.ship_imo}"
         
         try:
-            async with session.get(url) as response:
+            async with self.http_client.get(url) as response:
                 if response.status == 200:
                     data = await response.json()
                     return data
@@ -189,39 +244,170 @@ class ShipTracker:
             return None
     
     async def fetch_cruisemapper_data(self):
-        """Fetch ship data from CruiseMapper"""
+        """
+        Fetch the CruiseMapper page for the ship, or None if it has none
+        Raises SourceError if the site can't be reached or errors
+        """
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             }
             
-            url = f"https://www.cruisemapper.com/?imo={self.ship_imo}"
-            session = await self.get_session()
+            url = f"{Config.CRUISEMAPPER_BASE_URL}/?imo={self.ship_imo}"
+            status, html = await self.http_client.fetch_text(url, headers=headers)
+        except Exception as e:
+            raise SourceError(f"Error fetching CruiseMapper data: {e}") from e
+        if status == 404:
+            logger.warning(f"CruiseMapper has no page for IMO {self.ship_imo}")
+            return None
+        if status != 200:
+            raise SourceError(f"CruiseMapper returned status {status}")
+        logger.info(f"Successfully fetched CruiseMapper page for IMO {self.ship_imo}")
+        return html
+    
+    async def stream_cruisemapper_fields(self, revalidate=True):
+        """
+        Stream the CruiseMapper page and stop reading as soon as the position,
+        speed and destination have been seen, or after CRUISEMAPPER_MAX_BYTES
+        If the stream ends without them, the page read so far gets the full parse
+        Returns the extracted fields or None if nothing was found; raises SourceError
+        if the site can't be reached or errors
+        """
+        try:
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            }
             
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    logger.info(f"Successfully fetched CruiseMapper page for IMO {self.ship_imo}")
-                    return await response.text()
-                else:
-                    logger.warning(f"CruiseMapper returned status {response.status}")
+            url = f"{Config.CRUISEMAPPER_BASE_URL}/?imo={self.ship_imo}"
+            
+            async with self.http_client.get(url, headers=headers, revalidate=revalidate) as response:
+                if response.status == 304:
+                    # Page unchanged since the last read, so neither are its fields
+                    fields = self.http_client.revalidation.payload(url)
+                    if fields:
+                        logger.info(f"CruiseMapper page for IMO {self.ship_imo} not modified")
+                        return dict(fields)
+                    if revalidate:
+                        # The stored fields are gone, so read the page again
+                        self.http_client.revalidation.forget(url)
+                        response.close()
+                        return await self.stream_cruisemapper_fields(revalidate=False)
+                if response.status == 404:
+                    logger.warning(f"CruiseMapper has no page for IMO {self.ship_imo}")
                     return None
+                if response.status != 200:
+                    raise SourceError(f"CruiseMapper returned status {response.status}")
+                
+                extractor = page_parsers.CruiseMapperStreamExtractor()
+                decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+                bytes_read = 0
+                # The extractor trims what it has scanned, so keep the page (up to the byte cap) for the slow path
+                page = []
+                
+                async for chunk in response.content.iter_chunked(Config.CRUISEMAPPER_CHUNK_BYTES):
+                    bytes_read += len(chunk)
+                    text = decoder.decode(chunk)
+                    page.append(text)
+                    extractor.feed(text)
+                    if extractor.complete or bytes_read >= Config.CRUISEMAPPER_MAX_BYTES:
+                        break
+                else:
+                    text = decoder.decode(b'', final=True)
+                    page.append(text)
+                    extractor.feed(text, final=True)
+                
+                # Drop the connection rather than draining the rest of the page
+                response.close()
+                
+                fields = dict(extractor.fields)
+                if extractor.complete:
+                    logger.info(f"Extracted CruiseMapper data for IMO {self.ship_imo} from first {bytes_read} bytes")
+                else:
+                    logger.warning(f"CruiseMapper stream incomplete after {bytes_read} bytes, found {sorted(fields)}; "
+                                   f"parsing the page in full")
+                    with STAGE_SECONDS.time('parse', 'cruisemapper'):
+                        parsed = page_parsers.parse_cruisemapper_fields(''.join(page), fast=Config.ENABLE_FAST_PARSERS)
+                    fields = {**fields, **parsed}
+                
+                if all(key in fields for key in page_parsers.CruiseMapperStreamExtractor.REQUIRED):
+                    self.http_client.revalidation.store(url, response, dict(fields))
+                return fields or None
+        except SourceError:
+            raise
         except Exception as e:
-            logger.error(f"Error fetching CruiseMapper data: {e}")
-            return None
+            raise SourceError(f"Error streaming CruiseMapper data: {e}") from e
     
     async def fetch_ais_data(self):
-        """Fetch AIS data from multiple sources with fallback"""
-        # Try CruiseMapper first (has exact coordinates)
-        data = await self.fetch_cruisemapper_data()
-        if data:
-            parsed_data = self.parse_cruisemapper_data(data)
-            if parsed_data and not parsed_data.get('error'):
-                return parsed_data
+        """
+        Fetch AIS data with the position dead-reckoned forward from the last fix
+        when that fix is old enough for the ship to have moved noticeably
+        """
+        return estimate_current_positions([await self.fetch_ais_fix()])[0]
+    
+    async def fetch_ais_fix(self):
+        """
+        Fetch the last fix from the snapshot cache: fresh data as is, recent data at once
+        while it refreshes in the background, and the last good data if every source fails
+        """
+        return await self.snapshot_cache.get(self.ship_imo, self._fetch_ais_data_uncached)
+    
+    def get_cache_stats(self):
+        """Get snapshot cache hit/miss/coalesced counters"""
+        return self.snapshot_cache.stats()
+    
+    async def _fetch_ais_data_uncached(self):
+        """Fetch AIS data in the worker process when there is one, otherwise here"""
+        if self.worker is None:
+            return await self.fetch_fresh()
+        try:
+            return await self.worker.fetch(self.ship_imo)
+        except WorkerError as e:
+            logger.error(f"Worker fetch for {self.ship_name} failed: {e}")
+            return {
+                'error': True,
+                'message': 'Vessel data worker is unavailable',
+                'ship_name': self.ship_name,
+                'imo': self.ship_imo
+            }
+    
+    async def fetch_fresh(self):
+        """Fetch AIS data from multiple sources with fallback, bypassing the snapshot cache"""
+        # CruiseMapper first (has exact coordinates), then VesselFinder (good for general location)
+        preferred = {
+            'cruisemapper': self._fetch_from_cruisemapper,
+            'vesselfinder': self._fetch_from_vesselfinder
+        }
+        if Config.ENABLE_ADAPTIVE_SOURCES:
+            # Clearly slower sources go last; sources with an open circuit are skipped
+            sources = [preferred[name] for name in self.source_health.order(list(preferred))]
+            if not sources:
+                logger.warning(f"Every data source for {self.ship_name} has an open circuit, not fetching")
+        else:
+            sources = list(preferred.values())
         
-        # Fallback to VesselFinder (web scraping works, good for general location)
-        data = await self.fetch_vesselfinder_data()
-        if data:
-            return self.parse_vesselfinder_data(data)
+        if Config.ENABLE_HEDGED_FETCH:
+            parsed_data = await self._fetch_hedged(sources, Config.HEDGE_DELAY_SECONDS)
+        else:
+            parsed_data = None
+            for source in sources:
+                try:
+                    parsed_data = await source()
+                except Exception as e:
+                    logger.error(f"Source failed: {e}")
+                    continue
+                if has_ship_data(parsed_data):
+                    break
+        
+        if has_ship_data(parsed_data):
+            parsed_data['fetched_at'] = time.time()
+            if Config.ENABLE_POSITION_HISTORY:
+                # File I/O, so off the event loop like the snapshot save
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self._record_history, parsed_data)
+                except Exception as e:
+                    logger.error(f"Error recording {self.ship_name} position history: {e}")
+            await self._persist(self.snapshot_store.save, parsed_data)
+            return parsed_data
         
         # Only show error if all sources failed
         return {
@@ -231,6 +417,120 @@ class ShipTracker:
             'imo': self.ship_imo
         }
     
+    def _record_history(self, data):
+        """Fill in a missing course from the previous fix, then append this one (blocking)"""
+        if data.get('course') is None:
+            self._derive_course(data)
+        self.position_history.record(self.ship_imo, data)
+    
+    def _derive_course(self, data):
+        """Fill in course from the bearing between the previous recorded fix and this one"""
+        lat, lon = data.get('latitude'), data.get('longitude')
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            return
+        previous = self.position_history.latest(self.ship_imo)
+        if previous is None or not 0 < data['fetched_at'] - previous['timestamp'] <= 6 * 3600:
+            return
+        # Below a few cables GPS jitter dominates the bearing
+        if distance_nm(previous['latitude'], previous['longitude'], lat, lon) < 0.2:
+            return
+        data['course'] = round(initial_bearing(previous['latitude'], previous['longitude'], lat, lon), 1)
+    
+    async def _fetch_from_cruisemapper(self):
+        """Fetch and parse CruiseMapper data, or None if unusable"""
+        return await self._measure_source('cruisemapper', self._load_from_cruisemapper)
+    
+    async def _fetch_from_vesselfinder(self):
+        """Fetch and parse VesselFinder data, or None if unusable"""
+        return await self._measure_source('vesselfinder', self._load_from_vesselfinder)
+    
+    async def _measure_source(self, source, load):
+        """
+        Run one source's fetch and parse, recording its latency and outcome
+        Only a SourceError (or unexpected exception) counts against the source's breaker;
+        having nothing for this vessel doesn't, as health is shared by the whole fleet
+        """
+        health = self.source_health.get(source)
+        if Config.ENABLE_ADAPTIVE_SOURCES and not health.begin():
+            # Circuit open, or another request is already probing it
+            SOURCE_RESULTS.inc(source, 'skipped')
+            return None
+        start = time.monotonic()
+        try:
+            with STAGE_SECONDS.time('source', source):
+                parsed_data = await load()
+        except asyncio.CancelledError:
+            # Hedged fetches cancel the slower source
+            health.release(time.monotonic() - start)
+            SOURCE_RESULTS.inc(source, 'cancelled')
+            raise
+        except Exception:
+            health.record_failure(time.monotonic() - start)
+            SOURCE_RESULTS.inc(source, 'error')
+            raise
+        if parsed_data:
+            health.record_success(time.monotonic() - start)
+        else:
+            health.record_no_data(time.monotonic() - start)
+        SOURCE_RESULTS.inc(source, 'ok' if parsed_data else 'no_data')
+        return parsed_data
+    
+    async def _load_from_cruisemapper(self):
+        if Config.CRUISEMAPPER_STREAMING:
+            fields = await self.stream_cruisemapper_fields()
+            parsed_data = self.build_cruisemapper_data(fields) if fields else None
+        else:
+            data = await self.fetch_cruisemapper_data()
+            parsed_data = self.parse_cruisemapper_data(data) if data else None
+        
+        if parsed_data and parsed_data.get('error'):
+            raise SourceError(parsed_data.get('message', 'Error parsing CruiseMapper data'))
+        if has_ship_data(parsed_data):
+            parsed_data['source'] = 'cruisemapper'
+            return parsed_data
+        return None
+    
+    async def _load_from_vesselfinder(self):
+        data = await self.fetch_vesselfinder_data()
+        if data:
+            parsed_data = self.parse_vesselfinder_data(data)
+            if parsed_data and parsed_data.get('error'):
+                raise SourceError(parsed_data.get('message', 'Error parsing VesselFinder data'))
+            if has_ship_data(parsed_data):
+                parsed_data['source'] = 'vesselfinder'
+                return parsed_data
+            logger.warning(f"VesselFinder data for IMO {self.ship_imo} has no position, speed or destination")
+        return None
+    
+    async def _fetch_hedged(self, sources, hedge_delay):
+        """
+        Race sources in preference order, starting the next one after hedge_delay
+        seconds (or as soon as the previous one fails). Returns the first result
+        with usable ship data and cancels the rest, or None if every source failed.
+        """
+        remaining = list(sources)
+        pending = set()
+        try:
+            while remaining or pending:
+                if remaining:
+                    pending.add(asyncio.ensure_future(remaining.pop(0)()))
+                
+                # Only wait out the hedge delay while there is another source to launch
+                timeout = hedge_delay if remaining else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    if task.exception() is not None:
+                        logger.error(f"Hedged source failed: {task.exception()}")
+                    elif has_ship_data(task.result()):
+                        return task.result()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
     def parse_vesselfinder_data(self, data):
         """Parse VesselFinder data (both API and HTML scraping)"""
         try:
@@ -294,43 +594,38 @@ class ShipTracker:
     def parse_cruisemapper_data(self, html_content):
         """Parse ship data from CruiseMapper HTML"""
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            text_content = soup.get_text()
-            
+            with STAGE_SECONDS.time('parse', 'cruisemapper'):
+                fields = page_parsers.parse_cruisemapper_fields(html_content, fast=Config.ENABLE_FAST_PARSERS)
+        except Exception as e:
+            logger.error(f"Error parsing CruiseMapper data: {e}")
+            return {'error': True, 'message': 'Error parsing vessel data'}
+        return self.build_cruisemapper_data(fields)
+    
+    def build_cruisemapper_data(self, fields):
+        """Build ship data from extracted CruiseMapper fields"""
+        try:
             data = {
                 'ship_name': self.ship_name,
                 'imo': self.ship_imo,
                 'mmsi': self.ship_mmsi
             }
             
-            # Extract coordinates from JavaScript config
-            coord_match = re.search(r'"lat":([\d.-]+),"lon":([\d.-]+)', html_content)
-            if coord_match:
-                lat = float(coord_match.group(1))
-                lon = float(coord_match.group(2))
-                data['latitude'] = lat
-                data['longitude'] = lon
-            
-            # Extract speed - pattern: "Speed17 kn" or similar
-            speed_match = re.search(r'Speed\s*([\d.]+)\s*kn', text_content, re.IGNORECASE)
-            if speed_match:
-                speed = float(speed_match.group(1))
-                data['speed'] = speed
+            for key in ('latitude', 'longitude', 'speed', 'eta'):
+                if key in fields:
+                    data[key] = fields[key]
             
-            # Extract destination and ETA - pattern: "GB DVR > GI GIB ETAJuly 27, 05:00"
-            dest_eta_match = re.search(r'>\s*([A-Z]{2})\s*([A-Z]{3})\s*ETA([^S]+)', text_content)
-            if dest_eta_match:
-                # Map common port codes to readable names
-                port_codes = {
-                    'GIB': 'Gibraltar',
-                    'DVR': 'Dover',
-                    'SOU': 'Southampton',
-                    'LIS': 'Lisbon',
-                    'BAR': 'Barcelona'
-                }
-                dest_code = dest_eta_match.group(2)
-                data['destination'] = port_codes.get(dest_code, dest_code)
-                data['eta'] = dest_eta_match.group(3).strip()
+            if 'dest_code' in fields:
+                # Resolve the UN/LOCODE to a port name and position
+                dest_country = fields.get('dest_country', '')
+                dest_code = fields['dest_code']
+                port = resolve_port(dest_country, dest_code)
+                if port:
+                    data['destination'] = port.name
+                    data['destination_locode'] = port.locode
+                    data['destination_latitude'] = port.latitude
+                    data['destination_longitude'] = port.longitude
+                else:
+                    data['destination'] = f"{dest_country} {dest_code}".strip()
             
             # Set status based on speed
             speed_val = data.get('speed')
@@ -339,20 +634,13 @@ class ShipTracker:
             else:
                 data['status'] = 'At anchor'
             
-            # Extract current location name if available
+            # Name the sea area the ship is in
             lat_val = data.get('latitude')
             lon_val = data.get('longitude')
-            if lat_val and lon_val and isinstance(lat_val, (int, float)) and isinstance(lon_val, (int, float)):
-                # Determine general area based on coordinates
-                if 40 < lat_val < 60 and -10 < lon_val < 30:  # European waters
-                    if 48 < lat_val < 52 and -6 < lon_val < 2:  # English Channel
-                        data['current_location'] = 'English Channel'
-                    elif 35 < lat_val < 37 and -6 < lon_val < -5:  # Gibraltar area
-                        data['current_location'] = 'Strait of Gibraltar'
-                    elif 54 < lat_val < 60 and 10 < lon_val < 30:  # Baltic Sea
-                        data['current_location'] = 'Baltic Sea'
-                    else:
-                        data['current_location'] = 'European Waters'
+            if isinstance(lat_val, (int, float)) and isinstance(lon_val, (int, float)):
+                area = sea_area_name(lat_val, lon_val)
+                if area:
+                    data['current_location'] = area
             
             logger.info(f"Parsed CruiseMapper data: speed={data.get('speed')}, dest={data.get('destination')}, eta={data.get('eta')}, coords=({data.get('latitude')}, {data.get('longitude')})")
             return data
@@ -418,6 +706,27 @@ class ShipTracker:
         except Exception:
             return str(eta)
     
+    def format_voyage(self, voyage):
+        """Format remaining distance and predicted arrival for display"""
+        text = f"{voyage['distance_nm']:,.0f} nm"
+        if voyage['eta'] is not None:
+            arrival = datetime.fromtimestamp(voyage['eta'], timezone.utc)
+            basis = "average" if voyage['speed_source'] == 'average' else "current"
+            text += f"\nArriving ~{arrival.strftime('%b %d, %H:%M UTC')} at {basis} {voyage['speed_knots']:.1f} kn"
+        return text
+    
+    def format_age(self, seconds):
+        """Format a snapshot age for display"""
+        minutes = int(seconds // 60)
+        if minutes < 1:
+            return "under a minute"
+        if minutes < 60:
+            return f"{minutes} min"
+        hours, minutes = divmod(minutes, 60)
+        if hours < 48:
+            return f"{hours} h {minutes} min"
+        return f"{hours // 24} days"
+    
     def get_status_emoji(self, status):
         """Get emoji for navigation status"""
         if not status:
@@ -437,7 +746,55 @@ class ShipTracker:
             return "🚢"
     
     async def get_ship_status_embed(self):
-        """Create Discord embed with ship status"""
+        """Create Discord embed with ship status, plus the map file when one was rendered"""
+        embed, map_image = await self.get_ship_status_snapshot()
+        if map_image:
+            # Attach the map to Discord straight from memory
+            return embed, discord.File(io.BytesIO(map_image), filename=MAP_FILENAME)
+        return embed
+    
+    async def get_ship_status_snapshot(self):
+        """
+        Build the status embed and render the map once
+        Returns (embed, map PNG bytes or None); the bytes can be attached to any number of messages
+        """
+        embed, map_request = await self.build_status_embed()
+        if map_request is None:
+            return embed, None
+        map_image = await self.render_status_map(map_request)
+        self.attach_map(embed, map_image)
+        return embed, map_image
+    
+    async def render_status_map(self, map_request):
+        """Render the map for a build_status_embed map request; returns PNG bytes or None"""
+        lat, lon, heading = map_request
+        try:
+            map_image = await self.map_screenshotter.get_ship_map_image(lat, lon, heading)
+        except Exception as e:
+            logger.error(f"Error creating map screenshot: {e}")
+            return None
+        if map_image:
+            await self._persist(self.snapshot_store.save_map, lat, lon, heading, map_image)
+        return map_image
+    
+    def attach_map(self, embed, map_image):
+        """Show the rendered map in the embed, or a link to an online map when there is none"""
+        if map_image:
+            embed.set_image(url=f"attachment://{MAP_FILENAME}")
+        else:
+            map_url = f"https://www.vesselfinder.com/?imo={self.ship_imo}"
+            embed.add_field(
+                name="🗺️ Track on Map",
+                value=f"[View on VesselFinder]({map_url})",
+                inline=False
+            )
+    
+    async def build_status_embed(self):
+        """
+        Fetch the ship data and build the status embed without its map
+        Returns (embed, map request); the request is (latitude, longitude, heading) for
+        render_status_map, or None when there is no position to draw
+        """
         ship_data = await self.fetch_ais_data()
         
         if ship_data.get('error'):
@@ -458,7 +815,7 @@ class ShipTracker:
                 inline=False
             )
             embed.set_footer(text="Try again in a few minutes • Data from vessel tracking APIs")
-            return embed
+            return embed, None
         
         # Create status embed with real data
         status_emoji = self.get_status_emoji(ship_data.get('status'))
@@ -468,6 +825,16 @@ class ShipTracker:
             description="Current position and voyage information",
             color=discord.Color.blue()
         )
+        if ship_data.get('stale'):
+            # Every source failed, so this is the last good snapshot
+            embed.description = (f"⚠️ Tracking sources are unavailable. Showing the last known data "
+                                 f"from {self.format_age(ship_data['age_seconds'])} ago.")
+            embed.color = discord.Color.orange()
+        elif ship_data.get('age_seconds'):
+            embed.description = f"Position and voyage information from {self.format_age(ship_data['age_seconds'])} ago"
+        elif ship_data.get('restored'):
+            embed.description = (f"Last known position and voyage information from "
+                                 f"{self.format_age(time.time() - ship_data['fetched_at'])} ago, refreshing")
         
         # Position information
         coordinates = self.format_coordinates(
@@ -476,11 +843,18 @@ class ShipTracker:
             ship_data.get('current_location')
         )
         
-        embed.add_field(
-            name="📍 Current Position",
-            value=coordinates,
-            inline=True
-        )
+        if ship_data.get('estimated'):
+            embed.add_field(
+                name="📍 Estimated Position",
+                value=f"{coordinates}\n*Dead reckoned from a fix {self.format_age(ship_data['fix_age_seconds'])} ago*",
+                inline=True
+            )
+        else:
+            embed.add_field(
+                name="📍 Current Position",
+                value=coordinates,
+                inline=True
+            )
         
         # Speed only
         speed = self.format_speed(ship_data.get('speed'))
@@ -507,6 +881,15 @@ class ShipTracker:
             inline=True
         )
         
+        # Remaining distance along the sea-route graph and our own arrival estimate
+        voyage = self.voyage_estimator.estimate(self.ship_imo, ship_data)
+        if voyage:
+            embed.add_field(
+                name="🧭 Distance to Go",
+                value=self.format_voyage(voyage),
+                inline=True
+            )
+        
         # Navigation status
         status = ship_data.get('status', 'Unknown')
         embed.add_field(
@@ -547,47 +930,12 @@ class ShipTracker:
         else:
             embed.set_footer(text="Data from vessel tracking APIs")
         
-        # Add map screenshot if coordinates are available
+        # The map is drawn separately so the data can be sent before it is ready
         lat = ship_data.get('latitude')
         lon = ship_data.get('longitude')
-        if lat and lon:
-            try:
-                # Take screenshot of map
-                screenshot_path = await self.map_screenshotter.get_ship_map_screenshot(lat, lon, self.ship_name)
-                if screenshot_path and os.path.exists(screenshot_path):
-                    # Attach the screenshot to Discord
-                    file = discord.File(screenshot_path, filename="ship_location_map.png")
-                    embed.set_image(url="attachment://ship_location_map.png")
-                    
-                    # Clean up the temporary file after a delay
-                    asyncio.create_task(self._cleanup_temp_file(screenshot_path))
-                    
-                    return embed, file
-            except Exception as e:
-                logger.error(f"Error creating map screenshot: {e}")
-        
-        # Add map link if coordinates are available (fallback)
-        if ship_data.get('latitude') and ship_data.get('longitude'):
-            map_url = f"https://www.vesselfinder.com/?imo={self.ship_imo}"
-            embed.add_field(
-                name="🗺️ Track on Map",
-                value=f"[View on VesselFinder]({map_url})",
-                inline=False
-            )
-        
-        return embed
-
-    async def _cleanup_temp_file(self, file_path):
-        """Clean up temporary file after delay"""
-        try:
-            await asyncio.sleep(10)  # Wait 10 seconds before cleanup
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Cleaned up temporary file: {file_path}")
-        except Exception as e:
-            logger.error(f"Error cleaning up temp file {file_path}: {e}")
-
-    def __del__(self):
-        """Cleanup when object is destroyed"""
-        if hasattr(self, 'session') and self.session and not self.session.closed:
-            asyncio.create_task(self.session.close())
+        if not (lat and lon):
+            return embed, None
+        heading = ship_data.get('heading')
+        if heading is None:
+            heading = ship_data.get('course')
+        return embed, (lat, lon, heading)
@@ -0,0 +1,152 @@
+"""
+Snapshot cache for ship tracking bot
+Serves recent vessel snapshots from memory, coalesces concurrent fetches, and
+keeps serving the last good snapshot while a refresh runs or when sources fail
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SnapshotCache:
+    def __init__(self, ttl_seconds, max_stale_seconds=0):
+        self.ttl_seconds = ttl_seconds
+        # Snapshots up to this old are returned at once while a refresh runs in the background
+        self.max_stale_seconds = max_stale_seconds
+        self._entries = {}
+        self._inflight = {}
+        # Keys whose most recent load failed, so their cached snapshot is the last good one
+        self._failed = set()
+        # Keys seeded from elsewhere and not loaded since; served at once whatever their age
+        self._restored = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.fallbacks = 0
+
+    def peek(self, key):
+        """Return (snapshot, age_seconds) for a cached entry, or (None, None)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        stored_at, snapshot = entry
+        return snapshot, time.monotonic() - stored_at
+
+    async def get(self, key, loader):
+        """
+        Return the snapshot for key, calling loader() at most once per TTL window.
+        Concurrent callers during a fetch all await the same in-flight load.
+        A snapshot past its TTL but within max_stale_seconds, or seeded and not yet
+        reloaded, is returned at once while it is refreshed in the background. If the
+        load fails, the last good snapshot is returned labelled as stale.
+        """
+        snapshot, age = self.peek(key)
+        if snapshot is not None and age < self.ttl_seconds:
+            self.hits += 1
+            return snapshot
+
+        if snapshot is not None and (age < self.max_stale_seconds or key in self._restored):
+            self.stale_hits += 1
+            self._start_load(key, loader)
+            return self._label(key, snapshot, age)
+
+        if key in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        try:
+            result = await self.refresh(key, loader)
+        except Exception as e:
+            if snapshot is None:
+                raise
+            logger.error(f"Error refreshing snapshot {key}: {e}")
+            result = None
+
+        if (result is None or result.get('error')) and snapshot is not None:
+            self.fallbacks += 1
+            return self._label(key, snapshot, time.monotonic() - self._entries[key][0])
+        return result
+
+    def seed(self, key, snapshot, age_seconds):
+        """Store a snapshot obtained elsewhere, e.g. restored from disk, as if loaded age_seconds ago"""
+        self._entries[key] = (time.monotonic() - max(age_seconds, 0), snapshot)
+        self._restored.add(key)
+
+    def restored(self, key):
+        """Whether key still holds a seeded snapshot that no load has replaced"""
+        return key in self._restored
+
+    def prefetch(self, key, loader):
+        """Start loading key in the background unless a load is already running"""
+        self._start_load(key, loader)
+
+    async def refresh(self, key, loader):
+        """Load key now, joining a load already in flight"""
+        # Shield the shared load so one cancelled caller doesn't abort it for everyone
+        return await asyncio.shield(self._start_load(key, loader))
+
+    def _start_load(self, key, loader):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            # Background refreshes may have no awaiter left to see a failure
+            task.add_done_callback(self._consume_exception)
+            self._inflight[key] = task
+        return task
+
+    @staticmethod
+    def _consume_exception(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Snapshot refresh failed: {task.exception()}")
+
+    def _label(self, key, snapshot, age):
+        """Copy of a cached snapshot carrying its age, flagged stale if the last refresh failed"""
+        labelled = dict(snapshot, age_seconds=age)
+        if key in self._failed:
+            labelled['stale'] = True
+        return labelled
+
+    async def _load(self, key, loader):
+        """Run loader and store its result unless it reports an error"""
+        try:
+            snapshot = await loader()
+            if snapshot is not None and not snapshot.get('error'):
+                self._entries[key] = (time.monotonic(), snapshot)
+                self._failed.discard(key)
+                self._restored.discard(key)
+            else:
+                self._failed.add(key)
+            return snapshot
+        except Exception:
+            self._failed.add(key)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, key=None):
+        """Drop one cached entry, or all of them"""
+        if key is None:
+            self._entries.clear()
+            self._failed.clear()
+            self._restored.clear()
+        else:
+            self._entries.pop(key, None)
+            self._failed.discard(key)
+            self._restored.discard(key)
+
+    def stats(self):
+        """Get cache counters"""
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'fallbacks': self.fallbacks,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hit_ratio': (self.hits + self.stale_hits + self.coalesced) / lookups if lookups else 0.0
+        }
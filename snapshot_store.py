@@ -0,0 +1,97 @@
+"""
+Snapshot persistence for ship tracking bot
+Keeps each vessel's last good snapshot, and the last map rendered for it, on disk
+so a restarted bot can answer straight away while it fetches fresh data
+"""
+
+import base64
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+def write_atomic(path, data):
+    """Write bytes to path so readers see either the old file or the complete new one"""
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+class SnapshotStore:
+    def __init__(self, directory, save_maps=True):
+        self.directory = directory
+        self.save_maps = save_maps
+        # Last map position written per IMO, so re-serving a cached map doesn't rewrite it
+        self._saved_maps = {}
+
+    def _path(self, imo, suffix):
+        return os.path.join(self.directory, f"{imo}{suffix}")
+
+    def save(self, imo, snapshot):
+        """Persist a vessel's latest good snapshot (blocking)"""
+        os.makedirs(self.directory, exist_ok=True)
+        record = {'saved_at': time.time(), 'snapshot': snapshot}
+        write_atomic(self._path(imo, '.json'), json.dumps(record, default=str).encode('utf-8'))
+
+    def save_map(self, imo, latitude, longitude, heading, png_data):
+        """Persist the map last rendered for a vessel, unless it was already saved (blocking)"""
+        if not self.save_maps:
+            return
+        position = (latitude, longitude, heading)
+        if self._saved_maps.get(imo) == position:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # One file, so the image and the position it was rendered for are replaced together
+        record = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'heading': heading,
+            'png': base64.b64encode(png_data).decode('ascii')
+        }
+        write_atomic(self._path(imo, '.map.json'), json.dumps(record).encode('utf-8'))
+        self._saved_maps[imo] = position
+
+    def load(self, imo):
+        """
+        The persisted snapshot for a vessel as (snapshot, saved_at), or (None, None)
+        when there is none or it can't be read
+        """
+        try:
+            with open(self._path(imo, '.json'), encoding='utf-8') as f:
+                record = json.load(f)
+            return record['snapshot'], record['saved_at']
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable saved snapshot for IMO {imo}: {e}")
+            return None, None
+
+    def load_map(self, imo):
+        """The persisted map as (latitude, longitude, heading, png_data), or None"""
+        if not self.save_maps:
+            return None
+        try:
+            with open(self._path(imo, '.map.json'), encoding='utf-8') as f:
+                record = json.load(f)
+            png_data = base64.b64decode(record['png'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable saved map for IMO {imo}: {e}")
+            return None
+        position = (record.get('latitude'), record.get('longitude'), record.get('heading'))
+        self._saved_maps[imo] = position
+        return position + (png_data,)
@@ -0,0 +1,166 @@
+"""
+Source health for ship tracking bot
+Tracks each data source's success rate and latency, trips a circuit breaker on
+repeated failures, and moves clearly slow sources behind the others
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class SourceError(Exception):
+    """A source couldn't be reached, answered with an error or sent a page that couldn't be parsed"""
+
+class SourceHealth:
+    def __init__(self, name, alpha=0.2, failure_threshold=3, open_seconds=30, max_open_seconds=600):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        # Rolling success rate and attempt latency; latency is None until the first attempt
+        self.success_rate = 1.0
+        self.latency = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = open_seconds
+        self.opened_at = None
+        self.probing = False
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def available(self, now=None):
+        """Whether a request may be sent now; an open breaker half-opens once its cooldown ends"""
+        if self.state == OPEN:
+            now = time.monotonic() if now is None else now
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            logger.info(f"Source {self.name} half-open, probing")
+        return not (self.state == HALF_OPEN and self.probing)
+
+    def begin(self, now=None):
+        """Claim an attempt; in half-open state only one probe runs at a time"""
+        if not self.available(now):
+            self.skipped += 1
+            return False
+        if self.state == HALF_OPEN:
+            self.probing = True
+        return True
+
+    def expected_seconds(self):
+        """Expected time to valid data: attempt latency over success rate (0 before any attempt)"""
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(self.success_rate, 0.05)
+
+    def _observe(self, ok, latency):
+        self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+        self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+        self.probing = False
+
+    def record_success(self, latency):
+        self._observe(True, latency)
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"Source {self.name} recovered, closing circuit")
+        self.state = CLOSED
+        self.open_seconds = self.base_open_seconds
+
+    def record_no_data(self, latency):
+        """
+        The source answered but had nothing for this vessel. That says nothing about the
+        source itself, so it neither counts against the breaker nor lowers the success rate.
+        """
+        self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+        self.probing = False
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            logger.info(f"Source {self.name} answering again, closing circuit")
+            self.state = CLOSED
+            self.open_seconds = self.base_open_seconds
+
+    def record_failure(self, latency, now=None):
+        self._observe(False, latency)
+        self.failures += 1
+        self.consecutive_failures += 1
+        now = time.monotonic() if now is None else now
+        if self.state == HALF_OPEN:
+            # Failed probe: stay away twice as long
+            self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+            self._open(now)
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open(now)
+
+    def release(self, elapsed=None):
+        """
+        Give up an attempt without a verdict, e.g. when a hedged fetch cancels it
+        The source took at least elapsed seconds, so a lower latency estimate is raised to it
+        """
+        self.probing = False
+        if elapsed is not None and (self.latency is None or elapsed > self.latency):
+            self.latency = elapsed if self.latency is None else self.latency + self.alpha * (elapsed - self.latency)
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        logger.warning(f"Source {self.name} circuit open for {self.open_seconds:.0f}s "
+                       f"after {self.consecutive_failures} consecutive failures")
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'success_rate': self.success_rate,
+            'latency': self.latency,
+            'expected_seconds': self.expected_seconds(),
+            'successes': self.successes,
+            'failures': self.failures,
+            'skipped': self.skipped
+        }
+
+class SourceHealthMonitor:
+    def __init__(self, failure_threshold=3, open_seconds=30, max_open_seconds=600, alpha=0.2,
+                 slower_factor=3.0, slower_margin=2.0):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.alpha = alpha
+        # A source is clearly slower when its expected time is over slower_factor times
+        # and slower_margin seconds more than the fastest one's
+        self.slower_factor = slower_factor
+        self.slower_margin = slower_margin
+        self.sources = {}
+
+    def get(self, name):
+        """Health for a source, created on first use"""
+        health = self.sources.get(name)
+        if health is None:
+            health = self.sources[name] = SourceHealth(
+                name, self.alpha, self.failure_threshold, self.open_seconds, self.max_open_seconds
+            )
+        return health
+
+    def order(self, names):
+        """
+        Sources that may be tried now, in the given preference order except that clearly
+        slower ones go last. Sources never tried count as instant so each gets measured.
+        """
+        now = time.monotonic()
+        available = [name for name in names if self.get(name).available(now)]
+        if not available:
+            return []
+        fastest = min(self.get(name).expected_seconds() for name in available)
+        limit = max(fastest * self.slower_factor, fastest + self.slower_margin)
+        # Stable sort, so sources keep their preference order within each group
+        return sorted(available, key=lambda name: self.get(name).expected_seconds() > limit)
+
+    def stats(self):
+        """Get per-source health counters"""
+        return {name: health.stats() for name, health in self.sources.items()}
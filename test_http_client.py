@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Revalidation check: unchanged pages come back from the store on a 304, a 304
+whose stored page has gone is refetched in full, and the store stays bounded
+"""
+
+import asyncio
+from http_client import HttpClient, RevalidationCache
+from replay_server import ReplayServer
+
+IMO = '9818084'
+
+class FakeResponse:
+    def __init__(self, etag):
+        self.headers = {'ETag': etag}
+
+async def serve(check):
+    server = ReplayServer(port=0)
+    await server.start()
+    client = HttpClient()
+    try:
+        await check(server, client, f"{server.base_url}/?imo={IMO}")
+    finally:
+        await client.close()
+        await server.stop()
+
+def test_not_modified():
+    async def check(server, client, url):
+        status, page = await client.fetch_text(url)
+        assert status == 200 and page
+        assert await client.fetch_text(url) == (200, page)
+        assert server.requests[('cruisemapper', 304)] == 1
+        assert client.revalidation.revalidated == 1
+    asyncio.run(serve(check))
+
+def test_not_modified_without_payload():
+    async def check(server, client, url):
+        status, page = await client.fetch_text(url)
+        # Validators left behind by a page that was evicted
+        etag, last_modified, _ = client.revalidation._entries[url]
+        client.revalidation._entries[url] = (etag, last_modified, None)
+        assert await client.fetch_text(url) == (200, page)
+        assert server.requests[('cruisemapper', 304)] == 1
+        assert server.requests[('cruisemapper', 200)] == 2
+        # The refetched page is stored again
+        assert client.revalidation.payload(url) == page
+    asyncio.run(serve(check))
+
+def test_bounds():
+    cache = RevalidationCache(max_entries=3, max_bytes=1000)
+    for n in range(5):
+        cache.store(f"/{n}", FakeResponse(f'"{n}"'), 'x' * 100)
+    assert [cache.payload(f"/{n}") for n in range(5)] == [None, None, 'x' * 100, 'x' * 100, 'x' * 100]
+    assert cache.bytes == 300
+    # Large pages push out older ones to stay under the byte cap
+    cache.store('/big', FakeResponse('"big"'), 'y' * 900)
+    assert [cache.payload(url) for url in ('/2', '/3', '/4', '/big')] == [None, None, 'x' * 100, 'y' * 900]
+    assert cache.bytes == 1000
+    # A page over the cap on its own isn't kept at all
+    cache.store('/huge', FakeResponse('"huge"'), 'z' * 2000)
+    assert cache.headers_for('/huge') == {}
+    cache.forget('/big')
+    assert cache.bytes == 100
+
+if __name__ == "__main__":
+    test_not_modified()
+    test_not_modified_without_payload()
+    test_bounds()
+    print("Revalidation OK")
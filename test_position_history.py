@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Position history check: rows round-trip through the binary format, range bounds
+are inclusive, torn writes and corrupt headers don't break reads or appends
+"""
+
+import os
+import tempfile
+from position_history import HEADER, ROW, PositionHistory
+
+IMO = '9818084'
+
+def fix(latitude, longitude, **extra):
+    return dict(latitude=latitude, longitude=longitude, **extra)
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        history = PositionHistory(directory)
+        assert history.record(IMO, fix(50.123456, -1.654321, speed=15.8, course=231.4,
+                                       status='Under way', source='cruisemapper'), timestamp=1000)
+        row = history.latest(IMO)
+        assert row['timestamp'] == 1000
+        assert abs(row['latitude'] - 50.123456) < 1e-7 and abs(row['longitude'] + 1.654321) < 1e-7
+        assert (row['speed'], row['course'], row['status'], row['source']) == (15.8, 231.4, 'Under way', 'cruisemapper')
+        # Missing values come back as None, and rows without coordinates aren't written
+        assert history.record(IMO, fix(50.2, -1.6), timestamp=1001)
+        assert history.latest(IMO)['speed'] is None
+        assert not history.record(IMO, {'speed': 10}, timestamp=1002)
+
+def test_range_bounds():
+    with tempfile.TemporaryDirectory() as directory:
+        history = PositionHistory(directory)
+        for timestamp in range(100, 200, 10):
+            history.record(IMO, fix(50.0, -1.0), timestamp=timestamp)
+        # Rows must stay in time order
+        assert not history.record(IMO, fix(50.0, -1.0), timestamp=150)
+        timestamps = lambda rows: [row['timestamp'] for row in rows]
+        assert timestamps(history.range(IMO, start=120, end=150)) == [120, 130, 140, 150]
+        assert timestamps(history.range(IMO, start=121, end=149)) == [130, 140]
+        assert timestamps(history.range(IMO, end=99)) == []
+        assert timestamps(history.range(IMO, start=191)) == []
+        assert timestamps(history.range(IMO, limit=2)) == [180, 190]
+        assert history.at(IMO, 155)['timestamp'] == 150
+        assert history.count(IMO) == 10
+        assert history.range('0000000') == []
+
+def test_torn_row():
+    with tempfile.TemporaryDirectory() as directory:
+        history = PositionHistory(directory)
+        history.record(IMO, fix(50.0, -1.0), timestamp=100)
+        path = os.path.join(directory, f"{IMO}.pos")
+        with open(path, 'ab') as f:
+            f.write(b'\x01' * (ROW.size // 2))
+        # The partial row is ignored on read and dropped before the next append
+        assert history.count(IMO) == 1
+        reopened = PositionHistory(directory)
+        assert reopened.record(IMO, fix(51.0, -2.0), timestamp=200)
+        assert os.path.getsize(path) == HEADER.size + 2 * ROW.size
+        assert [row['latitude'] for row in reopened.range(IMO)] == [50.0, 51.0]
+
+def test_corrupt_header():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"{IMO}.pos")
+        with open(path, 'wb') as f:
+            f.write(b'JUNK' + b'\x00' * (HEADER.size - 4) + b'\x00' * ROW.size)
+        history = PositionHistory(directory)
+        # Reads come back empty rather than raising, and nothing is appended
+        assert history.range(IMO) == []
+        assert history.latest(IMO) is None
+        assert history.count(IMO) == 0
+        assert not history.record(IMO, fix(50.0, -1.0), timestamp=100)
+        assert os.path.getsize(path) == HEADER.size + ROW.size
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_range_bounds()
+    test_torn_row()
+    test_corrupt_header()
+    print("Position history OK")
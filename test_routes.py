@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Sea route regression check: routes between ports either side of a peninsula
+must go round it by sea, not straight across the land, and common cruise legs
+must come out close to their published port-to-port distances
+"""
+
+from voyage import get_graph
+
+# Allowed relative error against the published distance
+TOLERANCE = 0.2
+
+# (from, to, lat/lon of each, published sea distance in nm)
+ROUTES = [
+    # Round a peninsula rather than across it
+    ('Genoa', 'Venice', (44.4, 8.9), (45.43, 12.33), 1250),
+    ('Copenhagen', 'Esbjerg', (55.68, 12.6), (55.47, 8.45), 330),
+    ('Southampton', 'Gibraltar', (50.9, -1.4), (36.1, -5.35), 1150),
+    # Short legs the graph alone is too coarse for
+    ('Barcelona', 'Palma', (41.35, 2.17), (39.56, 2.63), 115),
+    ('Civitavecchia', 'Naples', (42.09, 11.79), (40.84, 14.26), 145),
+    ('Tallinn', 'Helsinki', (59.45, 24.77), (60.17, 24.95), 45),
+    ('Piraeus', 'Mykonos', (37.94, 23.64), (37.45, 25.33), 95),
+    ('Southampton', 'Le Havre', (50.9, -1.4), (49.48, 0.1), 105),
+    # Longer legs through the regional waypoints
+    ('Southampton', 'Bergen', (50.9, -1.4), (60.39, 5.32), 740),
+    ('Rotterdam', 'Southampton', (51.9, 4.5), (50.9, -1.4), 255),
+    ('Hamburg', 'Rotterdam', (53.54, 9.98), (51.9, 4.5), 300),
+    ('Kiel', 'Stockholm', (54.33, 10.15), (59.33, 18.07), 440),
+    ('Southampton', 'Bilbao', (50.9, -1.4), (43.35, -3.03), 540),
+]
+
+def test_routes():
+    graph = get_graph()
+    for origin, destination, start, end, published in ROUTES:
+        distance = graph.route_distance(*start, *end)
+        error = distance / published - 1
+        print(f"{origin} -> {destination}: {distance:.0f} nm (published {published}, {error:+.0%})")
+        assert abs(error) <= TOLERANCE, f"{origin} -> {destination} route is {distance:.0f} nm, published {published}"
+
+if __name__ == "__main__":
+    test_routes()
+    print("All routes OK")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Sea area regression check: ports and open-sea positions get the sea they lie in
+(or whose approaches they sit on), and inland positions get none
+"""
+
+import time
+from sea_areas import SeaAreaIndex, get_index
+
+PORTS = [
+    ('Southampton', (50.9, -1.4), 'English Channel'),
+    ('Dover', (51.12, 1.33), 'English Channel'),
+    ('Kiel', (54.33, 10.15), 'Baltic Sea'),
+    ('Genoa', (44.4, 8.93), 'Ligurian Sea'),
+    ('Hamburg', (53.54, 9.98), 'North Sea'),
+    ('Rotterdam', (51.9, 4.5), 'North Sea'),
+    ('Oslo', (59.9, 10.73), 'Skagerrak'),
+    ('Liverpool', (53.41, -3.0), 'Irish Sea'),
+    ('Belfast', (54.6, -5.92), 'Irish Sea'),
+    ('Tallinn', (59.45, 24.77), 'Gulf of Finland'),
+    ('Venice', (45.43, 12.33), 'Adriatic Sea'),
+    ('Barcelona', (41.35, 2.17), 'Mediterranean Sea'),
+    # Fixture position between the Bay of Biscay and the open ocean
+    ('Biscay approaches', (47.18, -7.07), 'North Atlantic Ocean'),
+    ('Mid Atlantic', (40.0, -30.0), 'North Atlantic Ocean'),
+    ('Madrid', (40.4, -3.7), None),
+]
+
+def test_ports():
+    index = get_index()
+    for place, (latitude, longitude), expected in PORTS:
+        name = index.lookup(latitude, longitude)
+        print(f"{place}: {name}")
+        assert name == expected, f"{place} named {name!r}, expected {expected!r}"
+
+def test_smallest_polygon_wins():
+    ocean = {'name': 'Ocean', 'polygons': [[[0, 0], [10, 0], [10, 10], [0, 10]]]}
+    bay = {'name': 'Bay', 'polygons': [[[2, 2], [4, 2], [4, 4], [2, 4]]]}
+    index = SeaAreaIndex([ocean, bay])
+    assert index.lookup(3, 3) == 'Bay'
+    assert index.lookup(7, 7) == 'Ocean'
+    # Just outside the ocean falls back to it; far outside is unknown
+    assert index.lookup(5, 10.5) == 'Ocean'
+    assert index.lookup(5, 20) is None
+
+def test_lookup_speed():
+    index = get_index()
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for _, (latitude, longitude), _ in PORTS:
+            index.lookup(latitude, longitude)
+    per_lookup_us = (time.perf_counter() - start) / (iterations * len(PORTS)) * 1e6
+    print(f"lookup: {per_lookup_us:.1f} µs")
+    assert per_lookup_us < 50, f"lookup takes {per_lookup_us:.1f} µs"
+
+if __name__ == "__main__":
+    test_ports()
+    test_smallest_polygon_wins()
+    test_lookup_speed()
+    print("All sea areas OK")
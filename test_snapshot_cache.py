@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Snapshot cache check: concurrent callers share one load, fresh entries are served
+from memory, stale and seeded entries are served while they refresh, and a failed
+refresh falls back to the last good snapshot
+"""
+
+import asyncio
+from snapshot_cache import SnapshotCache
+
+KEY = '9818084'
+
+class Loader:
+    """Counts calls and returns the snapshots (or raises the exceptions) it is given in turn"""
+    def __init__(self, *results, delay=0.01):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def test_coalescing():
+    async def check():
+        cache = SnapshotCache(ttl_seconds=60)
+        loader = Loader({'speed': 1})
+        results = await asyncio.gather(*(cache.get(KEY, loader) for _ in range(10)))
+        assert loader.calls == 1
+        assert all(result == {'speed': 1} for result in results)
+        assert (cache.misses, cache.coalesced) == (1, 9)
+        # Within the TTL the cached snapshot is served without a load
+        assert await cache.get(KEY, loader) == {'speed': 1}
+        assert (loader.calls, cache.hits) == (1, 1)
+    asyncio.run(check())
+
+def test_stale_while_revalidate():
+    async def check():
+        cache = SnapshotCache(ttl_seconds=0.2, max_stale_seconds=10)
+        loader = Loader({'speed': 1}, {'speed': 2})
+        await cache.get(KEY, loader)
+        await asyncio.sleep(0.25)
+        # Past the TTL the old snapshot comes back at once, labelled with its age
+        stale = await cache.get(KEY, loader)
+        assert stale['speed'] == 1 and stale['age_seconds'] >= 0.2 and 'stale' not in stale
+        await asyncio.sleep(0)
+        assert cache.stale_hits == 1 and loader.calls == 2
+        await asyncio.sleep(0.05)
+        assert await cache.get(KEY, loader) == {'speed': 2}
+    asyncio.run(check())
+
+def test_failed_refresh():
+    async def check():
+        cache = SnapshotCache(ttl_seconds=0.01)
+        loader = Loader({'speed': 1}, RuntimeError('sources down'), {'error': 'no data'})
+        await cache.get(KEY, loader)
+        await asyncio.sleep(0.02)
+        # Both a raised and a reported error fall back to the last good snapshot, flagged stale
+        for _ in range(2):
+            fallback = await cache.get(KEY, loader)
+            assert fallback['speed'] == 1 and fallback['stale']
+        assert cache.fallbacks == 2
+        # With nothing cached the failure reaches the caller
+        cache.invalidate(KEY)
+        try:
+            await cache.get(KEY, Loader(RuntimeError('sources down')))
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("failure with nothing cached was swallowed")
+    asyncio.run(check())
+
+def test_seeded():
+    async def check():
+        cache = SnapshotCache(ttl_seconds=60, max_stale_seconds=120)
+        cache.seed(KEY, {'speed': 1}, age_seconds=3600)
+        assert cache.restored(KEY)
+        # A restored snapshot is served whatever its age while the real load runs
+        loader = Loader({'speed': 2})
+        assert (await cache.get(KEY, loader))['speed'] == 1
+        await asyncio.sleep(0)
+        assert loader.calls == 1
+        await asyncio.sleep(0.02)
+        assert not cache.restored(KEY)
+        assert await cache.get(KEY, loader) == {'speed': 2}
+        # prefetch joins a load already running rather than starting another
+        cache.invalidate(KEY)
+        loader = Loader({'speed': 3})
+        cache.prefetch(KEY, loader)
+        assert await cache.get(KEY, loader) == {'speed': 3}
+        assert loader.calls == 1
+    asyncio.run(check())
+
+if __name__ == "__main__":
+    test_coalescing()
+    test_stale_while_revalidate()
+    test_failed_refresh()
+    test_seeded()
+    print("Snapshot cache OK")
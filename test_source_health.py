@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Source health check: breakers open after repeated failures, let one probe through
+once the cooldown ends and close on success; "no data" answers don't count as
+failures; and only clearly slower sources lose their place in the order
+"""
+
+from source_health import CLOSED, HALF_OPEN, OPEN, SourceHealth, SourceHealthMonitor
+
+def test_breaker():
+    health = SourceHealth('cruisemapper', failure_threshold=3, open_seconds=30, max_open_seconds=100)
+    for _ in range(2):
+        assert health.begin(now=0)
+        health.record_failure(1.0, now=0)
+    assert health.state == CLOSED
+    health.record_failure(1.0, now=0)
+    assert health.state == OPEN
+    assert not health.begin(now=10) and health.skipped == 1
+    # After the cooldown a single probe goes through
+    assert health.begin(now=31) and health.state == HALF_OPEN
+    assert not health.begin(now=31)
+    # A failed probe reopens for twice as long
+    health.record_failure(1.0, now=31)
+    assert health.state == OPEN and health.open_seconds == 60
+    assert not health.available(now=31 + 59)
+    assert health.begin(now=31 + 61)
+    health.record_failure(1.0, now=92)
+    assert health.open_seconds == 100
+    # A successful probe closes the breaker and resets the cooldown
+    assert health.begin(now=193)
+    health.record_success(0.5)
+    assert health.state == CLOSED and health.open_seconds == 30 and health.consecutive_failures == 0
+
+def test_release():
+    health = SourceHealth('vesselfinder', failure_threshold=1)
+    health.record_failure(1.0, now=0)
+    assert health.begin(now=31) and not health.begin(now=31)
+    # A cancelled probe frees the slot and raises the latency estimate to what it took
+    health.release(elapsed=5.0)
+    assert health.begin(now=31)
+    assert health.latency > 1.0
+
+def test_no_data():
+    health = SourceHealth('marinetraffic', failure_threshold=2)
+    health.record_failure(1.0, now=0)
+    health.record_no_data(1.0)
+    health.record_failure(1.0, now=0)
+    # The no-data answer broke the run of failures and left the success rate alone
+    assert health.state == CLOSED and health.failures == 2
+    success_rate = health.success_rate
+    health.record_no_data(1.0)
+    assert health.success_rate == success_rate
+    # It also closes a half-open breaker: the source is answering
+    health.record_failure(1.0, now=0)
+    health.record_failure(1.0, now=0)
+    assert health.state == OPEN
+    assert health.begin(now=31)
+    health.record_no_data(1.0)
+    assert health.state == CLOSED
+
+def test_order():
+    monitor = SourceHealthMonitor(slower_factor=3.0, slower_margin=2.0)
+    names = ['cruisemapper', 'vesselfinder', 'marinetraffic']
+    # Untried sources keep their preference order
+    assert monitor.order(names) == names
+    monitor.get('cruisemapper').record_success(2.0)
+    monitor.get('vesselfinder').record_success(1.0)
+    monitor.get('marinetraffic').record_success(1.5)
+    # Somewhat slower isn't enough to lose first place
+    assert monitor.order(names) == names
+    # Clearly slower goes last, the rest keep their order
+    monitor.get('cruisemapper').record_success(30.0)
+    monitor.get('cruisemapper').record_success(30.0)
+    assert monitor.order(names) == ['vesselfinder', 'marinetraffic', 'cruisemapper']
+    # Sources with an open breaker are left out
+    for _ in range(3):
+        monitor.get('vesselfinder').record_failure(1.0)
+    assert monitor.order(names) == ['marinetraffic', 'cruisemapper']
+
+if __name__ == "__main__":
+    test_breaker()
+    test_release()
+    test_no_data()
+    test_order()
+    print("Source health OK")
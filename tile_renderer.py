@@ -0,0 +1,253 @@
+"""
+Offline map rendering for ship tracking bot
+Stitches raster map tiles around the ship and draws its marker without a browser
+"""
+
+import asyncio
+import io
+import logging
+import math
+import os
+import aiohttp
+from http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+SEA_COLOR = (170, 211, 223)
+MARKER_COLOR = (220, 30, 30)
+OUTLINE_COLOR = (255, 255, 255)
+
+def lat_lon_to_world_pixel(latitude, longitude, zoom):
+    """Project lat/lon to Web Mercator pixel coordinates at the given zoom"""
+    scale = TILE_SIZE * (2 ** zoom)
+    lat = max(min(latitude, 85.05112878), -85.05112878)
+    x = (longitude + 180.0) / 360.0 * scale
+    lat_rad = math.radians(lat)
+    y = (1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * scale
+    return x, y
+
+class TileCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, z, x, y):
+        return os.path.join(self.directory, str(z), str(x), f"{y}.png")
+
+    def get(self, z, x, y):
+        """Return cached tile bytes, or None"""
+        path = self._path(z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Bump mtime so eviction drops least recently used tiles first
+            os.utime(path)
+            self.hits += 1
+            return data
+        except OSError:
+            self.misses += 1
+            return None
+
+    def put(self, z, x, y, data):
+        """Store tile bytes, evicting old tiles when over the size cap"""
+        path = self._path(z, x, y)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error caching map tile {z}/{x}/{y}: {e}")
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _scan(self):
+        """List (path, size, mtime) for every cached tile"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Remove least recently used tiles until under 90% of the cap"""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        """Get tile cache counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self._size
+        }
+
+class TileMapRenderer:
+    def __init__(self, tile_url, cache_dir, cache_max_bytes, run_blocking,
+                 width=1200, height=800, attribution="© OpenStreetMap contributors",
+                 http_client=None):
+        self.tile_url = tile_url
+        self.is_remote = tile_url.startswith(('http://', 'https://'))
+        # Local tile directories are already on disk, so only remote tiles are cached
+        self.tile_cache = TileCache(cache_dir, cache_max_bytes) if self.is_remote else None
+        self.run_blocking = run_blocking
+        self.width = width
+        self.height = height
+        self.attribution = attribution
+        # Tile downloads share the bot's connection pool when one is given
+        self.owns_http_client = http_client is None
+        self.http_client = http_client or HttpClient()
+
+    async def close(self):
+        """Close the HTTP client if this renderer created it"""
+        if self.owns_http_client:
+            await self.http_client.close()
+
+    async def fetch_tile(self, z, x, y):
+        """Get one tile from the cache, local directory, or tile server"""
+        url = self.tile_url.format(z=z, x=x, y=y)
+
+        if not self.is_remote:
+            path = url[len('file://'):] if url.startswith('file://') else url
+            try:
+                return await self.run_blocking(self._read_file, path)
+            except OSError:
+                logger.warning(f"Map tile not found: {path}")
+                return None
+
+        data = await self.run_blocking(self.tile_cache.get, z, x, y)
+        if data is not None:
+            return data
+
+        try:
+            async with self.http_client.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status != 200:
+                    logger.warning(f"Tile server returned status {response.status} for {z}/{x}/{y}")
+                    return None
+                data = await response.read()
+        except Exception as e:
+            logger.error(f"Error fetching map tile {z}/{x}/{y}: {e}")
+            return None
+
+        await self.run_blocking(self.tile_cache.put, z, x, y, data)
+        return data
+
+    def _read_file(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def render(self, latitude, longitude, zoom, heading=None):
+        """
+        Render a PNG map centred on the ship
+        Returns the PNG bytes or None if no tiles could be loaded
+        """
+        center_x, center_y = lat_lon_to_world_pixel(latitude, longitude, zoom)
+        left = center_x - self.width / 2
+        top = center_y - self.height / 2
+        tile_count = 2 ** zoom
+
+        first_tx = math.floor(left / TILE_SIZE)
+        last_tx = math.floor((left + self.width - 1) / TILE_SIZE)
+        first_ty = max(math.floor(top / TILE_SIZE), 0)
+        last_ty = min(math.floor((top + self.height - 1) / TILE_SIZE), tile_count - 1)
+
+        placements = []
+        requests = []
+        for ty in range(first_ty, last_ty + 1):
+            for tx in range(first_tx, last_tx + 1):
+                offset = (int(round(tx * TILE_SIZE - left)), int(round(ty * TILE_SIZE - top)))
+                placements.append(offset)
+                # Wrap horizontally across the antimeridian
+                requests.append(self.fetch_tile(zoom, tx % tile_count, ty))
+
+        tiles = await asyncio.gather(*requests)
+        if not any(tiles):
+            logger.warning(f"No map tiles available for {latitude}, {longitude} at zoom {zoom}")
+            return None
+
+        return await self.run_blocking(self._compose, list(zip(placements, tiles)), heading)
+
+    def _compose(self, placed_tiles, heading):
+        """Stitch tiles and draw the ship marker (blocking)"""
+        # Imported on first render so startup doesn't load Pillow
+        from PIL import Image, ImageDraw
+        image = Image.new('RGB', (self.width, self.height), SEA_COLOR)
+        for offset, data in placed_tiles:
+            if not data:
+                continue
+            try:
+                tile = Image.open(io.BytesIO(data)).convert('RGB')
+            except Exception as e:
+                logger.warning(f"Skipping unreadable map tile: {e}")
+                continue
+            image.paste(tile, offset)
+
+        draw = ImageDraw.Draw(image)
+        cx, cy = self.width / 2, self.height / 2
+
+        if heading is not None:
+            try:
+                self._draw_heading(draw, cx, cy, float(heading))
+            except (TypeError, ValueError):
+                pass
+
+        radius = 9
+        draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius),
+                     fill=MARKER_COLOR, outline=OUTLINE_COLOR, width=3)
+
+        if self.attribution:
+            text_width = draw.textlength(self.attribution)
+            box = (self.width - text_width - 10, self.height - 18, self.width, self.height)
+            draw.rectangle(box, fill=(255, 255, 255))
+            draw.text((box[0] + 5, box[1] + 3), self.attribution, fill=(60, 60, 60))
+
+        output = io.BytesIO()
+        image.save(output, format='PNG', compress_level=1)
+        return output.getvalue()
+
+    def _draw_heading(self, draw, cx, cy, heading):
+        """Draw an arrow from the marker along the ship's heading"""
+        angle = math.radians(heading)
+        dx, dy = math.sin(angle), -math.cos(angle)
+        length = 60
+        tip = (cx + dx * length, cy + dy * length)
+        draw.line((cx, cy, tip[0], tip[1]), fill=MARKER_COLOR, width=5)
+
+        # Arrow head: two points swept back from the tip
+        head = 16
+        left_angle = angle + math.radians(150)
+        right_angle = angle - math.radians(150)
+        draw.polygon([
+            tip,
+            (tip[0] + math.sin(left_angle) * head, tip[1] - math.cos(left_angle) * head),
+            (tip[0] + math.sin(right_angle) * head, tip[1] - math.cos(right_angle) * head)
+        ], fill=MARKER_COLOR)
@@ -0,0 +1,84 @@
+"""
+Vessel registry for ship tracking bot
+Loads the list of tracked ships and resolves names, aliases and IMO numbers
+"""
+
+import json
+import logging
+import os
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class Vessel:
+    def __init__(self, name, imo, mmsi=None, aliases=None):
+        self.name = name
+        self.imo = str(imo)
+        self.mmsi = str(mmsi) if mmsi else None
+        self.aliases = [alias.lower() for alias in (aliases or [])]
+
+    @classmethod
+    def default(cls):
+        """The ship the bot was built for"""
+        return cls(
+            "SPIRIT OF ADVENTURE",
+            Config.SPIRIT_OF_ADVENTURE_IMO,
+            Config.SPIRIT_OF_ADVENTURE_MMSI,
+            aliases=["cowie", "spirit of adventure"]
+        )
+
+    def __repr__(self):
+        return f"Vessel({self.name!r}, imo={self.imo!r})"
+
+class VesselRegistry:
+    def __init__(self, vessels):
+        if not vessels:
+            vessels = [Vessel.default()]
+        self.vessels = list(vessels)
+        self._by_key = {}
+        for vessel in self.vessels:
+            for key in [vessel.imo, vessel.name.lower(), *vessel.aliases]:
+                self._by_key.setdefault(key, vessel)
+
+    @classmethod
+    def load(cls, path):
+        """Load vessels from a JSON list, falling back to the default ship"""
+        if not path or not os.path.exists(path):
+            return cls([Vessel.default()])
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+            vessels = [
+                Vessel(entry['name'], entry['imo'], entry.get('mmsi'), entry.get('aliases'))
+                for entry in entries
+            ]
+            logger.info(f"Loaded {len(vessels)} vessels from {path}")
+            return cls(vessels)
+        except Exception as e:
+            logger.error(f"Error loading vessel registry {path}: {e}")
+            return cls([Vessel.default()])
+
+    @property
+    def default(self):
+        """The vessel used when a command names none"""
+        return self.vessels[0]
+
+    def resolve(self, query):
+        """Find a vessel by IMO, name, alias or unique name prefix"""
+        if not query:
+            return self.default
+        key = query.strip().lower()
+        vessel = self._by_key.get(key)
+        if vessel:
+            return vessel
+
+        matches = [v for v in self.vessels if v.name.lower().startswith(key)]
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def __iter__(self):
+        return iter(self.vessels)
+
+    def __len__(self):
+        return len(self.vessels)
@@ -0,0 +1,222 @@
+"""
+Voyage estimation for ship tracking bot
+Remaining distance along a sea-route waypoint graph and a predicted arrival time
+from the ship's recent average speed
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dead_reckoning import EARTH_RADIUS_NM
+from sea_areas import get_index
+
+logger = logging.getLogger(__name__)
+
+SEA_ROUTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sea_routes.json')
+
+def haversine_nm_many(latitude, longitude, points):
+    """Great-circle distances in nautical miles from one position to many (lat, lon) points"""
+    phi1 = math.radians(latitude)
+    cos_phi1 = math.cos(phi1)
+    lambda1 = math.radians(longitude)
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    diameter = 2 * EARTH_RADIUS_NM
+    distances = []
+    for lat, lon in points:
+        phi2 = radians(lat)
+        a = sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos(phi2) * sin((radians(lon) - lambda1) / 2) ** 2
+        distances.append(diameter * asin(min(1.0, sqrt(a))))
+    return distances
+
+class SeaRouteGraph:
+    def __init__(self, nodes, edges, connect=4, direct_max_nm=40, is_sea=None, candidates=12,
+                 coast_nm=15, sample_nm=10, spread=1.5, spread_nm=30):
+        """
+        nodes maps a waypoint name to (lat, lon); edges are pairs of names.
+        Routes join the graph at up to connect of the nearest waypoints at each end that
+        can be reached by sea and are no further than spread times (or spread_nm more
+        than) the nearest of them; ends closer than direct_max_nm are joined directly.
+        is_sea(lat, lon) tells water from land along the way in; the first coast_nm
+        from a port are not checked. Without it, only the nearest waypoint is used.
+        """
+        self.names = list(nodes)
+        self.points = [tuple(nodes[name]) for name in self.names]
+        index = {name: i for i, name in enumerate(self.names)}
+        self.connect = connect
+        self.direct_max_nm = direct_max_nm
+        self.is_sea = is_sea
+        self.candidates = candidates
+        self.coast_nm = coast_nm
+        self.sample_nm = sample_nm
+        # The sea area polygons are coarse (the Mediterranean one covers Italy), so a much
+        # further waypoint is more likely across land than a better way in
+        self.spread = spread
+        self.spread_nm = spread_nm
+        self.adjacency = [[] for _ in self.names]
+        for a, b in edges:
+            i, j = index[a], index[b]
+            distance = haversine_nm_many(*self.points[i], [self.points[j]])[0]
+            self.adjacency[i].append((j, distance))
+            self.adjacency[j].append((i, distance))
+
+    @classmethod
+    def load(cls, path=SEA_ROUTES_FILE):
+        """Build the graph from a JSON file of nodes and edges"""
+        with open(path, encoding='utf-8') as f:
+            routes = json.load(f)
+        graph = cls(routes['nodes'], routes['edges'], is_sea=get_index().covers)
+        logger.info(f"Loaded sea route graph with {len(graph.names)} waypoints from {path}")
+        return graph
+
+    def _by_sea(self, latitude, longitude, point, distance, coast_at_end=False):
+        """
+        Whether the straight line from a position to a point stays on water; with
+        coast_at_end the last coast_nm are not checked either, as the point is a port too
+        """
+        steps = int(distance // self.sample_nm)
+        for step in range(1, steps + 1):
+            along = step * self.sample_nm
+            if along < self.coast_nm or (coast_at_end and distance - along < self.coast_nm):
+                continue
+            fraction = along / distance
+            if not self.is_sea(latitude + (point[0] - latitude) * fraction,
+                               longitude + (point[1] - longitude) * fraction):
+                return False
+        return True
+
+    def _nearest(self, latitude, longitude):
+        """The waypoints a position joins the graph at, as (index, distance) pairs"""
+        distances = haversine_nm_many(latitude, longitude, self.points)
+        nearest = sorted(range(len(distances)), key=distances.__getitem__)[:self.candidates]
+        if self.is_sea is None:
+            return [(nearest[0], distances[nearest[0]])]
+        # A closer waypoint across a peninsula would let the route cut over land
+        reachable = [i for i in nearest if self._by_sea(latitude, longitude, self.points[i], distances[i])]
+        if not reachable:
+            return [(nearest[0], distances[nearest[0]])]
+        limit = max(distances[reachable[0]] * self.spread, distances[reachable[0]] + self.spread_nm)
+        return [(i, distances[i]) for i in reachable[:self.connect] if distances[i] <= limit]
+
+    def route_distance(self, from_lat, from_lon, to_lat, to_lon):
+        """Shortest sea-route distance in nautical miles between two positions"""
+        direct = haversine_nm_many(from_lat, from_lon, [(to_lat, to_lon)])[0]
+        if direct <= self.direct_max_nm or not self.points:
+            return direct
+        # Open water all the way: the graph is too coarse to beat a straight line
+        if self.is_sea is not None and self._by_sea(from_lat, from_lon, (to_lat, to_lon), direct, coast_at_end=True):
+            return direct
+
+        exits = dict(self._nearest(to_lat, to_lon))
+        best = math.inf
+        queue = [(distance, i) for i, distance in self._nearest(from_lat, from_lon)]
+        heapq.heapify(queue)
+        settled = {}
+        while queue:
+            distance, i = heapq.heappop(queue)
+            if i in settled or distance >= best:
+                continue
+            settled[i] = distance
+            if i in exits:
+                best = min(best, distance + exits[i])
+            for j, length in self.adjacency[i]:
+                if j not in settled:
+                    heapq.heappush(queue, (distance + length, j))
+        return best if best < math.inf else direct
+
+_default_graph = None
+
+def get_graph():
+    """The bundled sea route graph, built on first use"""
+    global _default_graph
+    if _default_graph is None:
+        try:
+            _default_graph = SeaRouteGraph.load()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading sea routes from {SEA_ROUTES_FILE}: {e}")
+            _default_graph = SeaRouteGraph({}, [])
+    return _default_graph
+
+class VoyageEstimator:
+    def __init__(self, position_history=None, cell_degrees=0.1, max_entries=4096,
+                 speed_window_seconds=6 * 3600, min_speed=1.0):
+        self.position_history = position_history
+        self.cell_degrees = cell_degrees
+        self.max_entries = max_entries
+        self.speed_window_seconds = speed_window_seconds
+        self.min_speed = min_speed
+        # Route distances keyed by (position cell, destination); the graph search is the costly part
+        self._distances = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def remaining_distance(self, latitude, longitude, dest_key, dest_lat, dest_lon):
+        """Sea-route distance to the destination, cached per position cell"""
+        key = (round(latitude / self.cell_degrees), round(longitude / self.cell_degrees), dest_key)
+        distance = self._distances.get(key)
+        if distance is not None:
+            self._distances.move_to_end(key)
+            self.hits += 1
+            return distance
+        self.misses += 1
+        distance = get_graph().route_distance(latitude, longitude, dest_lat, dest_lon)
+        self._distances[key] = distance
+        while len(self._distances) > self.max_entries:
+            self._distances.popitem(last=False)
+        return distance
+
+    def average_speed(self, imo, now):
+        """Average speed in knots over the recorded track in the recent window, or None"""
+        if self.position_history is None:
+            return None
+        rows = self.position_history.range(imo, start=now - self.speed_window_seconds)
+        if len(rows) < 2:
+            return None
+        elapsed = rows[-1]['timestamp'] - rows[0]['timestamp']
+        if elapsed < 1800:
+            return None
+        travelled = 0.0
+        for previous, row in zip(rows, rows[1:]):
+            travelled += haversine_nm_many(previous['latitude'], previous['longitude'],
+                                           [(row['latitude'], row['longitude'])])[0]
+        return travelled / (elapsed / 3600)
+
+    def estimate(self, imo, data, now=None):
+        """
+        Remaining distance and predicted arrival for a snapshot with a resolved destination
+        Returns a dict of distance_nm, speed_knots, speed_source and eta (epoch seconds or
+        None when the ship isn't making way), or None without position or destination
+        """
+        lat, lon = data.get('latitude'), data.get('longitude')
+        dest_lat, dest_lon = data.get('destination_latitude'), data.get('destination_longitude')
+        if None in (lat, lon, dest_lat, dest_lon):
+            return None
+        now = time.time() if now is None else now
+
+        dest_key = data.get('destination_locode') or (round(dest_lat, 2), round(dest_lon, 2))
+        distance = self.remaining_distance(lat, lon, dest_key, dest_lat, dest_lon)
+
+        speed, speed_source = self.average_speed(imo, now), 'average'
+        if speed is None or speed < self.min_speed:
+            try:
+                speed, speed_source = float(data.get('speed')), 'current'
+            except (TypeError, ValueError):
+                speed = None
+        eta = now + distance / speed * 3600 if speed and speed >= self.min_speed else None
+        return {
+            'distance_nm': distance,
+            'speed_knots': speed,
+            'speed_source': speed_source,
+            'eta': eta
+        }
+
+    def stats(self):
+        """Get route cache counters"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._distances)
+        }
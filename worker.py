@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Fetch/render worker for ship tracking bot
+Runs scraping, parsing and map rendering in a separate process so they can't
+starve or crash the Discord gateway connection. The bot talks to it over a
+Unix socket and gets back snapshot dicts and PNG bytes.
+
+Frames are a 4-byte big-endian header length, a JSON header, then header['size']
+bytes of binary payload (0 when absent).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import time
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_HEADER_BYTES = 1024 * 1024
+
+class WorkerError(Exception):
+    """The worker couldn't answer: not running, disconnected, timed out or failed"""
+
+async def read_frame(reader):
+    """Read one (header, payload) frame; raises IncompleteReadError at EOF"""
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_HEADER_BYTES:
+        raise WorkerError(f"Frame header of {length} bytes is too large")
+    header = json.loads(await reader.readexactly(length))
+    size = header.get('size', 0)
+    payload = await reader.readexactly(size) if size else b''
+    return header, payload
+
+def encode_frame(header, payload=b''):
+    header = dict(header, size=len(payload))
+    body = json.dumps(header, default=str).encode('utf-8')
+    return FRAME_HEADER.pack(len(body)) + body + payload
+
+class WorkerClient:
+    def __init__(self, socket_path, spawn=True, timeout=60, start_timeout=30):
+        """
+        Talks to the worker at socket_path. With spawn, the worker process is started,
+        restarted with backoff when it exits, and stopped on close().
+        """
+        self.socket_path = socket_path
+        self.spawn = spawn
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.process = None
+        self.restarts = 0
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._monitor_task = None
+        self._connect_lock = asyncio.Lock()
+        self._closing = False
+
+    async def start(self):
+        """Start the worker process (if spawning) and connect to it"""
+        if self.spawn:
+            await self._spawn()
+            self._monitor_task = asyncio.create_task(self._monitor())
+        await self._connect()
+
+    async def _spawn(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # The worker exits when its stdin closes, so it never outlives the bot
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), '--socket', self.socket_path,
+            stdin=asyncio.subprocess.PIPE
+        )
+        deadline = time.monotonic() + self.start_timeout
+        while not os.path.exists(self.socket_path):
+            if self.process.returncode is not None or time.monotonic() > deadline:
+                raise WorkerError(f"Worker failed to start (exit code {self.process.returncode})")
+            await asyncio.sleep(0.05)
+        logger.info(f"Started worker process {self.process.pid} on {self.socket_path}")
+
+    async def _monitor(self):
+        """Restart the worker whenever it exits, backing off while it keeps failing"""
+        backoff = 1
+        while not self._closing:
+            started = time.monotonic()
+            code = await self.process.wait()
+            if self._closing:
+                return
+            logger.error(f"Worker process {self.process.pid} exited with code {code}, restarting in {backoff}s")
+            await self._disconnect(WorkerError(f"Worker exited with code {code}"))
+            await asyncio.sleep(backoff)
+            backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 30)
+            try:
+                await self._spawn()
+                self.restarts += 1
+            except Exception as e:
+                logger.error(f"Error restarting worker: {e}")
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise WorkerError(f"Can't connect to worker at {self.socket_path}: {e}") from e
+            self._reader_task = asyncio.create_task(self._read_responses(self._reader, self._writer))
+
+    async def _read_responses(self, reader, writer):
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                future = self._pending.pop(header.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result((header, payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A newer connection may already have replaced this one
+            if self._writer is writer:
+                await self._disconnect(WorkerError(f"Lost connection to worker: {e!r}"))
+
+    async def _disconnect(self, error):
+        """Drop the connection and fail every request waiting on it"""
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def request(self, op, payload=b'', **fields):
+        """Send one request and return (header, payload); raises WorkerError on any failure"""
+        await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(encode_frame(dict(fields, id=request_id, op=op), payload))
+            await self._writer.drain()
+            header, response_payload = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise WorkerError(f"Worker didn't answer {op} within {self.timeout}s") from None
+        except (OSError, AttributeError) as e:
+            await self._disconnect(WorkerError(str(e)))
+            raise WorkerError(f"Error sending {op} to worker: {e}") from e
+        finally:
+            self._pending.pop(request_id, None)
+        if not header.get('ok'):
+            raise WorkerError(header.get('error', f"Worker failed {op}"))
+        return header, response_payload
+
+    async def fetch(self, imo):
+        """Fetch and parse a vessel's snapshot in the worker"""
+        header, _ = await self.request('fetch', imo=imo)
+        return header['snapshot']
+
+    async def render(self, latitude, longitude, heading=None):
+        """Render a map in the worker; returns PNG bytes or None"""
+        _, payload = await self.request('render', latitude=latitude, longitude=longitude, heading=heading)
+        return payload or None
+
+    async def close(self):
+        self._closing = True
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        await self._disconnect(WorkerError("Worker client closed"))
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        if self.process is not None and self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+
+class WorkerServer:
+    def __init__(self, socket_path):
+        from fleet_tracker import FleetTracker
+        self.socket_path = socket_path
+        self.fleet = FleetTracker()
+        self._server = None
+
+    async def start(self):
+        await self.fleet.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # Bind under a temporary name so the client only sees the socket once it accepts
+        temp_path = self.socket_path + '.tmp'
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        self._server = await asyncio.start_unix_server(self.handle_connection, temp_path)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, self.socket_path)
+        logger.info(f"Worker listening on {self.socket_path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        await self.fleet.close()
+
+    async def handle_connection(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                header, payload = await read_frame(reader)
+                # Answer requests concurrently; each response goes out in a single write
+                task = asyncio.create_task(self.handle_request(header, payload, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            logger.error(f"Worker connection error: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def handle_request(self, header, payload, writer):
+        response, response_payload = {'id': header.get('id'), 'ok': True}, b''
+        try:
+            op = header.get('op')
+            if op == 'fetch':
+                tracker = self.fleet.resolve(header['imo'])
+                if tracker is None:
+                    raise WorkerError(f"Unknown vessel {header['imo']}")
+                response['snapshot'] = await tracker.fetch_fresh()
+            elif op == 'render':
+                response_payload = await self.fleet.map_screenshotter.get_ship_map_image(
+                    header['latitude'], header['longitude'], header.get('heading')
+                ) or b''
+            elif op != 'ping':
+                raise WorkerError(f"Unknown operation {op!r}")
+        except Exception as e:
+            logger.error(f"Worker {header.get('op')} failed: {e}")
+            response, response_payload = {'id': header.get('id'), 'ok': False, 'error': str(e)}, b''
+        try:
+            writer.write(encode_frame(response, response_payload))
+            await writer.drain()
+        except (ConnectionError, RuntimeError):
+            pass
+
+async def serve(socket_path):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    # Exit when the bot goes away and closes our stdin
+    stdin = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin)
+
+    async def watch_parent():
+        await stdin.read()
+        stop.set()
+
+    watcher = asyncio.create_task(watch_parent())
+    server = WorkerServer(socket_path)
+    await server.start()
+    try:
+        await stop.wait()
+    finally:
+        watcher.cancel()
+        await server.close()
+
+if __name__ == "__main__":
+    from log_setup import configure_logging
+    parser = argparse.ArgumentParser(description="Fetch and render worker for the ship tracking bot")
+    parser.add_argument('--socket', default=Config.WORKER_SOCKET)
+    args = parser.parse_args()
+    # The worker does the work itself rather than handing it to another worker
+    Config.ENABLE_WORKER = False
+    log_root, log_ext = os.path.splitext(Config.LOG_FILE) if Config.LOG_FILE else ('', '')
+    configure_logging(
+        level=Config.LOG_LEVEL,
+        log_file=f"{log_root}.worker{log_ext}" if Config.LOG_FILE else None,
+        json_format=Config.LOG_FORMAT == 'json',
+        max_bytes=Config.LOG_MAX_BYTES,
+        backup_count=Config.LOG_BACKUP_COUNT,
+        rotate_when=Config.LOG_ROTATE_WHEN
+    )
+    asyncio.run(serve(args.socket))